@@ -0,0 +1,52 @@
+"""
+Parsing throughput of ``parse_date``/``parse_time`` against calling dateutil for every value, on the kinds of values
+``create`` and ``create-batch`` get.
+
+    python benchmarks/bench_dates.py 100000
+"""
+import sys
+from itertools import cycle, islice
+from timeit import default_timer
+
+from dateutil.parser import parse
+
+from qikfiller.utils.date_time import _parse_date_string, _parse_time_string, parse_date, parse_time
+
+TIMES = ['10am', '10:30pm', '13:30', '9:15', '2h', '30m', '1h30m', '1.5h'] + \
+        ['{}:{:02d}'.format(hour, minute) for hour in range(7, 19) for minute in range(0, 60, 15)]
+DATES = ['2017-03-{:02d}'.format(day) for day in range(1, 32)] + ['2feb', '14 Mar 2017', '1/3/2017']
+
+
+def dateutil_time(value):
+    return parse(value).time()
+
+
+def dateutil_date(value):
+    return parse(value, dayfirst=True).date()
+
+
+def time_calls(function, values):
+    start = default_timer()
+    for value in values:
+        function(value)
+    return default_timer() - start
+
+
+def run(n, name, values, baseline, function, clear_cache):
+    values = list(islice(cycle(values), n))
+    results = {'dateutil': time_calls(baseline, values)}
+    clear_cache()
+    results['cold'] = time_calls(function, values[:len(set(values))])
+    results['warm'] = time_calls(function, values)
+    print('{name}: dateutil {rate_dateutil:>10,.0f}/s  first parse {rate_cold:>10,.0f}/s  cached {rate_warm:>10,.0f}/s'
+          .format(name=name, rate_dateutil=n / results['dateutil'], rate_cold=len(set(values)) / results['cold'],
+                  rate_warm=n / results['warm']))
+
+
+def main(n):
+    run(n, 'times', TIMES, dateutil_time, parse_time, _parse_time_string.cache_clear)
+    run(n, 'dates', DATES, dateutil_date, parse_date, _parse_date_string.cache_clear)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
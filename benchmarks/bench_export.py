@@ -0,0 +1,57 @@
+"""
+Compare totalling entry hours by client and type row by row in Python with the numpy columns behind ``export``.
+
+    python benchmarks/bench_export.py 100000 500000
+"""
+import sys
+from collections import defaultdict
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from timeit import default_timer
+
+from bench_report import N_TASKS, build_cache
+from fixtures import entries
+from qikfiller.cache.entries import parse_timestamp
+from qikfiller.cache.export import cached_entry_columns, entry_columns
+from qikfiller.cache.query import connect
+
+
+def row_by_row(path, items):
+    connection = connect(path)
+    clients = dict(connection.execute('SELECT id, root_client_id FROM tasks'))
+    totals = defaultdict(float)
+    for entry in items:
+        hours = (parse_timestamp(entry['end_time']) - parse_timestamp(entry['start_time'])).total_seconds() / 3600
+        totals[clients.get(entry['task_id']), entry['type_id']] += hours
+    return totals
+
+
+def run(n_entries, directory):
+    path = join(directory, 'export-{}.db'.format(n_entries))
+    build_cache(path, n_entries)
+    items = list(entries(n_entries, N_TASKS))
+    results = {}
+    for name, total in (
+        ('rows', lambda: row_by_row(path, items)),
+        ('search', lambda: entry_columns(items, path=path).rollup(['client', 'type'])),
+        ('cache', lambda: cached_entry_columns(path=path).rollup(['client', 'type'])),
+    ):
+        start = default_timer()
+        total()
+        results[name] = default_timer() - start
+    print('{n_entries:>8} entries: row by row {rows:6.2f}s  columns from search results {search:6.2f}s  '
+          'columns from cache {cache:6.2f}s'.format(n_entries=n_entries, **results))
+
+
+def main(sizes):
+    directory = mkdtemp()
+    try:
+        for n_entries in sizes:
+            run(n_entries, directory)
+    finally:
+        rmtree(directory)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100000])
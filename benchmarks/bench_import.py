@@ -0,0 +1,61 @@
+"""
+Guard CLI cold start: import ``qikfiller.cli`` in fresh interpreters with ``-X importtime`` and fail if it gets
+slower than the budget or starts importing modules that only some subcommands need.
+
+    python benchmarks/bench_import.py [--runs 10] [--budget-ms 400]
+"""
+import argparse
+import subprocess
+import sys
+from statistics import median
+
+MODULE = 'qikfiller.cli'
+LAZY_MODULES = ('requests', 'marshmallow', 'dateutil', 'fire')
+
+
+def import_time(module=MODULE):
+    """
+    Cumulative import time of ``module`` in microseconds, as reported by ``-X importtime``.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True,
+    )
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1])
+    raise RuntimeError('No importtime line for {}'.format(module))
+
+
+def eagerly_imported(module=MODULE, lazy_modules=LAZY_MODULES):
+    code = 'import sys, {module}; print(" ".join(m for m in {lazy!r} if m in sys.modules))'.format(
+        module=module, lazy=lazy_modules)
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    return result.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=400)
+    args = parser.parse_args()
+
+    timings = sorted(import_time() / 1000. for _ in range(args.runs))
+    print('import {module}: median {median:.1f}ms  min {min:.1f}ms  max {max:.1f}ms  ({runs} runs)'.format(
+        module=MODULE, median=median(timings), min=timings[0], max=timings[-1], runs=args.runs))
+
+    failures = []
+    if median(timings) > args.budget_ms:
+        failures.append('median import time {:.1f}ms is over the {:.1f}ms budget'.format(median(timings),
+                                                                                        args.budget_ms))
+    eager = eagerly_imported()
+    if eager:
+        failures.append('{} imported eagerly: {}'.format(MODULE, ', '.join(eager)))
+    for failure in failures:
+        print('FAIL: {}'.format(failure))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Time ``report`` queries against an entries cache holding a few years of entries.
+
+    python benchmarks/bench_report.py 100000 1000000
+"""
+import sys
+from datetime import date
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from timeit import default_timer
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fixtures import entries, group_rows, tasks_payload
+from qikfiller.cache.entries import store_entries
+from qikfiller.cache.migrations import create_schema
+from qikfiller.cache.report import report_rows
+from qikfiller.cache.upsert import bulk_upsert
+from qikfiller.schemas.lists.client import ClientsSchema
+
+N_TASKS = 5000
+REPORTS = (
+    ('client', {}),
+    ('client,task', {'task_depth': 1}),
+    ('user,week', {}),
+    ('category,type,month', {}),
+)
+
+
+def build_cache(path, n_entries):
+    engine = create_engine('sqlite:///{}'.format(path))
+    with engine.begin() as connection:
+        create_schema(connection)
+    session = sessionmaker(bind=engine)()
+    for table, rows in group_rows(ClientsSchema(strict=True).load(tasks_payload(N_TASKS)).data.clients).items():
+        bulk_upsert(session, table, rows)
+    store_entries(session, entries(n_entries, N_TASKS))
+    session.commit()
+    session.close()
+
+
+def run(n_entries, directory):
+    path = join(directory, 'entries-{}.db'.format(n_entries))
+    start = default_timer()
+    build_cache(path, n_entries)
+    print('{:>8} entries: stored in {:.2f}s'.format(n_entries, default_timer() - start))
+    for by, options in REPORTS:
+        start = default_timer()
+        rows = report_rows(by, start=date(2017, 1, 1), end=date(2017, 1, 31), path=path, **options)
+        month = default_timer() - start
+        start = default_timer()
+        report_rows(by, path=path, **options)
+        everything = default_timer() - start
+        print('  {by:<22} one month {month:7.1f}ms ({rows} rows)  everything {everything:8.1f}ms'.format(
+            by=by, month=month * 1000, rows=len(rows), everything=everything * 1000))
+
+
+def main(sizes):
+    directory = mkdtemp()
+    try:
+        for n_entries in sizes:
+            run(n_entries, directory)
+    finally:
+        rmtree(directory)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100000])
@@ -0,0 +1,53 @@
+"""
+Compare how many objects a second ``FastLoader`` and the marshmallow clients schema load. That they load the same
+rows is checked in ``tests/test_fast_loader.py``.
+
+    python benchmarks/bench_schemas.py 10000 100000
+"""
+import sys
+from timeit import default_timer
+
+from fixtures import group_rows, tasks_payload
+from qikfiller.cache.orm import Client
+from qikfiller.cache.sync import group_loaded
+from qikfiller.schemas.lists.client import ClientsSchema
+from qikfiller.schemas.lists.fast import FastLoader
+
+def marshmallow_rows(payload):
+    return group_rows(ClientsSchema(strict=True).load(payload).data.clients)
+
+
+def fast_rows(payload, sample=None):
+    return group_loaded(Client, FastLoader(ClientsSchema, sample=sample).load(payload))
+
+
+def count_objects(payload):
+    def count(tasks):
+        return sum(1 + count(task['sub_tasks']) for task in tasks)
+    return sum(1 + count(client['tasks']) for client in payload['clients'])
+
+
+def run(n_tasks):
+    payload = tasks_payload(n_tasks)
+    n_objects = count_objects(payload)
+    results = {}
+    for name, load in (
+        ('marshmallow', lambda: marshmallow_rows(payload)),
+        ('fast', lambda: fast_rows(payload)),
+        ('sampled', lambda: fast_rows(payload, sample=100)),
+    ):
+        start = default_timer()
+        load()
+        results[name] = n_objects / (default_timer() - start)
+    print('{n_objects:>8} objects: marshmallow {marshmallow:>10,.0f}/s  fast {fast:>10,.0f}/s  '
+          'fast validating 100 clients {sampled:>10,.0f}/s'.format(
+        n_objects=n_objects, **results))
+
+
+def main(sizes):
+    for n_tasks in sizes:
+        run(n_tasks)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,233 @@
+"""
+End to end benchmarks of the CLI against a local stand-in QikTimes server (see ``server.py``), for each of a range
+of task counts. Every command runs in a fresh interpreter with its own home directory, as it would from a shell,
+and its wall time and peak memory are recorded. Results are written as JSON, so runs can be compared:
+
+    python benchmarks/bench_suite.py --tasks 1000,10000,100000 --depth 2
+    python benchmarks/bench_suite.py --tasks 1000000 --runs 1 --output big.json
+    python benchmarks/bench_suite.py --compare results/before.json results/after.json
+
+The benchmarks are ``init``, ``load`` (and ``load --stream``), an unchanged ``sync``, ``tasks``, resolving task
+names with ``get_task_field``, ``search``, ``create`` and ``create-batch``, plus ``startup``: the cheapest command
+that reads the cache (``complete types``).
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+from collections import OrderedDict
+from datetime import datetime
+from os.path import abspath, dirname, join
+from shutil import rmtree
+from statistics import median
+from tempfile import mkdtemp
+from timeit import default_timer
+
+from server import FixtureServer
+
+HERE = dirname(abspath(__file__))
+SRC = join(dirname(HERE), 'src')
+RESULTS = join(HERE, 'results')
+
+CLI = 'from qikfiller.cli import main; main()'
+RESOLVE = """
+import io, sys
+from contextlib import redirect_stdout
+from timeit import default_timer
+from qikfiller.cache.orm import get_session
+from qikfiller.utils.fields import get_task_field
+
+session = get_session()
+start = default_timer()
+with redirect_stdout(io.StringIO()):
+    for name in sys.argv[1:]:
+        get_task_field(session, name)
+print(default_timer() - start)
+"""
+# Global options for every command: no rate limit, and always fetch the lists in full
+OPTIONS = ['--rate-limit', '0', '--http-cache=False']
+
+
+class CommandFailed(Exception):
+    pass
+
+
+def environment(home):
+    env = dict(os.environ, HOME=home, QIKFILLER_DAEMON='0')
+    env['PYTHONPATH'] = os.pathsep.join(path for path in (SRC, os.environ.get('PYTHONPATH')) if path)
+    for name in ('QIKFILLER_TRACE', 'QIKFILLER_CPROFILE', 'QIK_API_KEY', 'QIK_API_URL'):
+        env.pop(name, None)
+    return env
+
+
+def run(code, args, env):
+    """
+    Run ``python -c code *args``, returning its wall time, peak resident memory (in MiB) and output.
+    """
+    with open(os.devnull, 'rb') as stdin, open(join(env['HOME'], 'stdout'), 'w+') as stdout, \
+            open(join(env['HOME'], 'stderr'), 'w+') as stderr:
+        start = default_timer()
+        process = subprocess.Popen([sys.executable, '-c', code] + args, env=env, stdin=stdin, stdout=stdout,
+                                   stderr=stderr)
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = default_timer() - start
+        stdout.seek(0)
+        stderr.seek(0)
+        if status != 0:
+            raise CommandFailed('{args} exited with {status}:\n{stderr}'.format(
+                args=' '.join(args), status=status, stderr=stderr.read()))
+        # ru_maxrss is in KiB on linux, bytes on macOS
+        peak = usage.ru_maxrss / (1024. * 1024 if sys.platform == 'darwin' else 1024.)
+        return seconds, peak, stdout.read()
+
+
+def write_batch(path, rows, n_tasks):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('type', 'task', 'category', 'date', 'start', 'duration', 'description'))
+        for i in range(rows):
+            writer.writerow((i % 2 + 1, i % n_tasks + 1, i % 5 + 1, '2017-03-01', '9am', '1h', 'Entry {}'.format(i)))
+
+
+def task_names(n_tasks, count):
+    step = max(n_tasks // count, 1)
+    return ['Task {:07d}'.format(task_id) for task_id in range(1, n_tasks + 1, step)][:count]
+
+
+def benchmarks(server, home, args):
+    """
+    ``(name, code, argv, items)`` of each benchmark, in the order they are run (``init`` has to come first).
+    ``items`` is what the per second throughput is counted in, if anything.
+    """
+    batch = join(home, 'batch.csv')
+    write_batch(batch, args.creates, server.n_tasks)
+    names = task_names(server.n_tasks, args.resolve)
+    return [
+        ('init', CLI, ['init', '--qik-api-key', 'benchmark', '--qik-api-url', server.api_url] + OPTIONS,
+         server.n_tasks),
+        ('load', CLI, ['load'] + OPTIONS, server.n_tasks),
+        ('load_stream', CLI, ['load', '--stream'] + OPTIONS, server.n_tasks),
+        ('sync', CLI, ['sync'] + OPTIONS, server.n_tasks),
+        ('startup', CLI, ['complete', 'types'], None),
+        ('tasks', CLI, ['tasks'], server.n_tasks),
+        ('get_task_field', RESOLVE, names, len(names)),
+        ('search', CLI, ['search', '--start', '2017-01-01', '--end', '2099-12-31'] + OPTIONS, server.n_entries),
+        ('create', CLI, ['create', '1', names[0], '1', '--date', '2017-03-01', '--start', '9am', '--duration', '1h']
+         + OPTIONS, 1),
+        ('create_batch', CLI, ['create-batch', batch] + OPTIONS, args.creates),
+    ]
+
+
+def run_size(n_tasks, args):
+    server = FixtureServer(n_tasks, depth=args.depth, fan_out=args.fan_out, n_clients=args.clients,
+                           n_entries=args.entries).start()
+    home = mkdtemp(prefix='qikfiller-bench-')
+    env = environment(home)
+    results = []
+    try:
+        for name, code, argv, items in benchmarks(server, home, args):
+            if args.only and name not in args.only:
+                if name == 'init':
+                    # Everything else needs the cache it creates
+                    run(code, argv, env)
+                continue
+            timings, peaks = [], []
+            for _ in range(args.runs):
+                seconds, peak, output = run(code, argv, env)
+                # The resolution script times itself, leaving out interpreter startup and imports
+                timings.append(float(output) if code is RESOLVE else seconds)
+                peaks.append(peak)
+            result = OrderedDict((
+                ('benchmark', name),
+                ('tasks', server.n_tasks),
+                ('seconds', round(median(timings), 6)),
+                ('min_seconds', round(min(timings), 6)),
+                ('peak_rss_mib', round(max(peaks), 1)),
+                ('items', items),
+                ('per_second', round(items / median(timings), 1) if items else None),
+            ))
+            print('{tasks:>9} tasks  {benchmark:<15} {seconds:9.3f}s  {rate:>12}/s  {peak_rss_mib:8.1f}MiB'.format(
+                rate='{:,.0f}'.format(result['per_second']) if items else '-', **result))
+            results.append(result)
+    finally:
+        server.stop()
+        rmtree(home, ignore_errors=True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, universal_newlines=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = {(result['benchmark'], result['tasks']): result for result in json.load(f)['results']}
+    with open(after_path) as f:
+        after = json.load(f)['results']
+    print('{:<15} {:>9} {:>10} {:>10} {:>8}  {:>10} {:>9}'.format(
+        'benchmark', 'tasks', 'before', 'after', 'change', 'MiB before', 'after'))
+    for result in after:
+        old = before.get((result['benchmark'], result['tasks']))
+        if old is None:
+            continue
+        print('{:<15} {:>9} {:>9.3f}s {:>9.3f}s {:>+7.1f}%  {:>10.1f} {:>9.1f}'.format(
+            result['benchmark'], result['tasks'], old['seconds'], result['seconds'],
+            (result['seconds'] / old['seconds'] - 1) * 100 if old['seconds'] else 0,
+            old['peak_rss_mib'], result['peak_rss_mib']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', default='1000,10000,100000',
+                        help='Comma separated numbers of tasks to run the benchmarks with')
+    parser.add_argument('--depth', type=int, default=2, help='Depth of each tree of sub tasks')
+    parser.add_argument('--fan-out', type=int, default=3, help='Sub tasks of each task')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--entries', type=int, default=10000, help='Events the search endpoint returns')
+    parser.add_argument('--creates', type=int, default=200, help='Rows in the create-batch file')
+    parser.add_argument('--resolve', type=int, default=100, help='Task names to resolve with get_task_field')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--only', help='Comma separated benchmarks to run (init is always run)')
+    parser.add_argument('--output', help='File to write the results to. Default: results/<time>-<commit>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two results files')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return 0
+    args.only = set(args.only.split(',')) if args.only else None
+
+    started_at = datetime.now()
+    commit = git_commit()
+    results = []
+    for n_tasks in (int(n) for n in args.tasks.split(',')):
+        results.extend(run_size(n_tasks, args))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS, exist_ok=True)
+        output = join(RESULTS, '{:%Y%m%d-%H%M%S}-{}.json'.format(started_at, commit or 'unknown'))
+    meta = OrderedDict((
+        ('commit', commit),
+        ('started_at', started_at.isoformat()),
+        ('python', sys.version.split()[0]),
+        ('platform', sys.platform),
+        ('depth', args.depth),
+        ('fan_out', args.fan_out),
+        ('clients', args.clients),
+        ('entries', args.entries),
+        ('runs', args.runs),
+    ))
+    with open(output, 'w') as f:
+        json.dump(OrderedDict((('meta', meta), ('results', results))), f, indent=2)
+    print('Wrote {output}'.format(output=output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Compare writing a tasks payload to the cache with the per-object ``session.merge`` loop against ``bulk_upsert``.
+
+    python benchmarks/bench_upsert.py 10000 100000
+"""
+import sys
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from timeit import default_timer
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fixtures import group_rows, tasks_payload
+from qikfiller.cache.orm import Base
+from qikfiller.cache.upsert import bulk_upsert
+from qikfiller.schemas.lists.client import ClientsSchema
+
+
+def fresh_session(directory, name):
+    engine = create_engine('sqlite:///{}'.format(join(directory, name)))
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def merge_loop(session, clients):
+    for client in clients:
+        session.merge(client)
+    session.commit()
+
+
+def upsert(session, clients):
+    for table, rows in group_rows(clients).items():
+        bulk_upsert(session, table, rows)
+    session.commit()
+
+
+def run(n_tasks, directory):
+    payload = tasks_payload(n_tasks)
+    results = {}
+    for name, write in (('merge', merge_loop), ('upsert', upsert)):
+        clients = ClientsSchema(strict=True).load(payload).data.clients
+        session = fresh_session(directory, '{}-{}.db'.format(name, n_tasks))
+        start = default_timer()
+        write(session, clients)
+        results[name] = default_timer() - start
+        session.close()
+    print('{n_tasks:>8} tasks: merge {merge:8.2f}s  upsert {upsert:8.2f}s  ({speedup:.1f}x)'.format(
+        n_tasks=n_tasks, speedup=results['merge'] / results['upsert'], **results))
+
+
+def main(sizes):
+    directory = mkdtemp()
+    try:
+        for n_tasks in sizes:
+            run(n_tasks, directory)
+    finally:
+        rmtree(directory)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,147 @@
+"""
+Synthetic QikTimes payloads for benchmarking.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import count
+
+from qikfiller.cache.orm import Client, Task
+from qikfiller.cache.sync import ancestry
+
+
+def make_task(ids, depth, fan_out):
+    task_id = next(ids)
+    return {
+        'id': task_id,
+        # Zero padded, so that no task name is part of another and every task can be resolved by name
+        'name': 'Task {:07d}'.format(task_id),
+        'owner_id': 1,
+        'owner_name': 'Owner',
+        'custom_fields': ['field-a', 'field-b'],
+        'archived': task_id % 10 == 0,
+        'estimated_hours': task_id % 40,
+        'sub_tasks': [make_task(ids, depth - 1, fan_out) for _ in range(fan_out)] if depth > 0 else [],
+    }
+
+
+def tasks_payload(n_tasks, n_clients=50, depth=2, fan_out=3):
+    """
+    A ``tasks.json`` payload with roughly ``n_tasks`` tasks spread over ``n_clients`` clients, each top level task
+    carrying a ``depth`` deep tree of sub tasks with ``fan_out`` children per node.
+    """
+    per_tree = sum(fan_out ** level for level in range(depth + 1))
+    n_trees = max(n_tasks // per_tree, 1)
+    ids = count(1)
+    clients = [{
+        'id': client_id,
+        'name': 'Client {}'.format(client_id),
+        'owner_id': 1,
+        'owner_name': 'Owner',
+        'custom_fields': [],
+        'tasks': [],
+    } for client_id in range(1, n_clients + 1)]
+    for i in range(n_trees):
+        clients[i % n_clients]['tasks'].append(make_task(ids, depth, fan_out))
+    return {'clients': clients}
+
+
+def users_payload(n_users=20):
+    return {'users': [{
+        'id': user_id, 'name': 'User {}'.format(user_id), 'login': 'user{}'.format(user_id), 'time_zone': 'Brisbane',
+        'email': 'user{}@example.com'.format(user_id), 'first_name': 'User', 'last_name': str(user_id),
+        'enabled': True, 'is_admin': user_id == 1, 'updated_at': '2017-03-01T10:00:00+10:00',
+        'last_login': '2017-03-01T10:00:00+10:00', 'created_at': '2016-01-01T00:00:00+10:00',
+    } for user_id in range(1, n_users + 1)]}
+
+
+def types_payload():
+    return {'types': [
+        {'id': 1, 'name': 'Billable', 'colour': '#00ff00', 'enabled': True, 'user_creatable': True},
+        {'id': 2, 'name': 'Unbillable', 'colour': '#ff0000', 'enabled': True, 'user_creatable': True},
+    ]}
+
+
+def categories_payload(n_categories=5):
+    return {'categories': [
+        {'id': category_id, 'name': 'Category {}'.format(category_id)} for category_id in range(1, n_categories + 1)
+    ]}
+
+
+def tag_types_payload():
+    return {'tag_types': [{'id': 1, 'name': 'Jira', 'description': 'Jira issue'}]}
+
+
+def list_payloads(n_tasks, n_clients=50, depth=2, fan_out=3, n_users=20):
+    """
+    Every list endpoint's payload, keyed by endpoint, for an instance with roughly ``n_tasks`` tasks
+    (see ``tasks_payload``).
+    """
+    return {
+        'users': users_payload(n_users),
+        'tag_types': tag_types_payload(),
+        'types': types_payload(),
+        'categories': categories_payload(),
+        'tasks': tasks_payload(n_tasks, n_clients, depth, fan_out),
+    }
+
+
+def entry(i, n_tasks, n_users=20, start=datetime(2017, 1, 2, 9)):
+    """
+    The ``i``th (from 0) search api entry: on one of task ids ``1..n_tasks``, 8 a day from ``start``.
+    """
+    start_time = start + timedelta(days=i // 8, hours=i % 8)
+    return {
+        'id': i + 1,
+        'task_id': i % n_tasks + 1,
+        'type_id': i % 2 + 1,
+        'category_id': i % 5 + 1,
+        'owner_id': i % n_users + 1,
+        'start_time': start_time.isoformat(),
+        'end_time': (start_time + timedelta(minutes=45)).isoformat(),
+        'description': 'Entry {}'.format(i),
+        'jira_id': '',
+        'created_at': start_time.isoformat(),
+        'updated_at': start_time.isoformat(),
+    }
+
+
+def entries(n_entries, n_tasks, n_users=20, start=datetime(2017, 1, 2, 9)):
+    """
+    ``n_entries`` search api entries spread over task ids ``1..n_tasks``, 8 a day from ``start``.
+    """
+    for i in range(n_entries):
+        yield entry(i, n_tasks, n_users, start)
+
+
+def to_row(obj, **overrides):
+    row = {column.name: getattr(obj, column.name) for column in obj.__table__.columns}
+    row.update(overrides)
+    return row
+
+
+def flatten_task(task, root_client_id, parent=None):
+    row = to_row(task, **ancestry(task.id, root_client_id, parent))
+    yield Task, row
+    for sub_task in task.sub_tasks or []:
+        for table_row in flatten_task(sub_task, root_client_id, parent=row):
+            yield table_row
+
+
+def flatten(objects):
+    """
+    The marshmallow list schemas' counterpart of ``qikfiller.cache.sync.flatten_loaded``: turn the objects they
+    produce into ``(table, row)`` pairs.
+    """
+    for obj in objects:
+        yield type(obj), to_row(obj)
+        if isinstance(obj, Client):
+            for task in obj.tasks or []:
+                for table_row in flatten_task(task, obj.id):
+                    yield table_row
+
+
+def group_rows(objects):
+    tables = OrderedDict()
+    for table, row in flatten(objects):
+        tables.setdefault(table, []).append(row)
+    return tables
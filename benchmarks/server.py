@@ -0,0 +1,149 @@
+"""
+A local stand-in for a QikTimes instance, serving the generated payloads of ``fixtures``: every list endpoint (with
+ETags, and gzipped for clients that accept it), a paginated ``entries/search.json`` and an ``entries.json`` that
+accepts (and counts) new entries.
+
+    python benchmarks/server.py --tasks 100000 --depth 3 --port 8765
+
+then point qikfiller at the url it prints.
+"""
+import argparse
+import gzip
+import json
+import threading
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+from fixtures import entry, list_payloads
+
+API_PATH = '/api/v1/'
+
+
+def count_tasks(tasks):
+    return sum(1 + count_tasks(task['sub_tasks']) for task in tasks)
+
+
+class QikTimesHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real thing, so that the client's connection pool is exercised
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=()):
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '') and len(body) > 1024
+        if gzipped:
+            body = gzip.compress(body, compresslevel=1)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        for header, value in headers:
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _endpoint(self):
+        url = urlsplit(self.path)
+        endpoint = url.path[len(API_PATH):] if url.path.startswith(API_PATH) else None
+        return endpoint, {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+    def do_GET(self):
+        endpoint, params = self._endpoint()
+        if endpoint == 'entries/search.json':
+            page, limit = int(params.get('page', 1)), int(params.get('limit', 100))
+            ids = range((page - 1) * limit, min(page * limit, self.server.n_entries))
+            self._send(200, json.dumps({'entries': [entry(i, self.server.n_tasks) for i in ids]}).encode('utf-8'))
+            return
+        name = endpoint[:-len('.json')] if endpoint and endpoint.endswith('.json') else None
+        if name not in self.server.bodies:
+            self._send(404, b'{}')
+            return
+        etag = self.server.etags[name]
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, headers=(('ETag', etag),))
+            return
+        gzipped = self.server.gzipped[name] if 'gzip' in self.headers.get('Accept-Encoding', '') else None
+        body = gzipped or self.server.bodies[name]
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        endpoint, params = self._endpoint()
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if endpoint != 'entries.json':
+            self._send(404, b'{}')
+            return
+        with self.server.lock:
+            self.server.created += 1
+            entry_id = self.server.n_entries + self.server.created
+        self._send(201, json.dumps({'entry': {'id': entry_id}}).encode('utf-8'))
+
+
+class FixtureServer(ThreadingMixIn, HTTPServer):
+    """
+    Serves ``fixtures.list_payloads(n_tasks, ...)`` and ``n_entries`` search results on ``host:port`` (by default a
+    free port). The payloads are encoded (and gzipped) once up front, so serving them costs next to nothing.
+    """
+    daemon_threads = True
+
+    def __init__(self, n_tasks, depth=2, fan_out=3, n_clients=50, n_entries=10000, host='127.0.0.1', port=0):
+        super(FixtureServer, self).__init__((host, port), QikTimesHandler)
+        payloads = list_payloads(n_tasks, n_clients=n_clients, depth=depth, fan_out=fan_out)
+        # The tree shape rounds the number of tasks down to whole trees
+        self.n_tasks = sum(count_tasks(client['tasks']) for client in payloads['tasks']['clients'])
+        self.n_entries = n_entries
+        self.bodies = {name: json.dumps(payload).encode('utf-8') for name, payload in payloads.items()}
+        self.gzipped = {name: gzip.compress(body, compresslevel=6) for name, body in self.bodies.items()}
+        self.etags = {name: '"{}"'.format(sha1(body).hexdigest()) for name, body in self.bodies.items()}
+        self.created = 0
+        self.lock = threading.Lock()
+
+    @property
+    def api_url(self):
+        host, port = self.server_address[:2]
+        return 'http://{host}:{port}{path}'.format(host=host, port=port, path=API_PATH)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--fan-out', type=int, default=3)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--entries', type=int, default=10000)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server = FixtureServer(args.tasks, depth=args.depth, fan_out=args.fan_out, n_clients=args.clients,
+                           n_entries=args.entries, host=args.host, port=args.port)
+    print('Serving {tasks} tasks and {entries} entries at {url}'.format(
+        tasks=server.n_tasks, entries=server.n_entries, url=server.api_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
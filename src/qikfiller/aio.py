@@ -0,0 +1,215 @@
+"""
+An asyncio-native QikFiller, for embedding in services:
+
+    async with AsyncQikFiller(profile_name='acme') as qikfiller:
+        await qikfiller.load()
+        responses = await asyncio.gather(*(
+            qikfiller.create('Billable', task, 'Code Review', date='2017-03-01', start='9am', duration='1h')
+            for task in tasks
+        ))
+        async for entry in qikfiller.search(start='2017-03-01', clients=['tea']):
+            ...
+
+Needs aiohttp: ``pip install qikfiller[async]``.
+"""
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from qikfiller.api import NOT_MODIFIED, list_cache_key
+from qikfiller.api.aio import AsyncQikApi, import_aiohttp
+from qikfiller.cache.fts import refresh_name_search
+from qikfiller.cache.index import refresh_index, session_index
+from qikfiller.cache.orm import Category, Task, Type, get_session
+from qikfiller.cache.sync import group_loaded, reset_sync_state
+from qikfiller.cache.upsert import bulk_upsert
+from qikfiller.constants import (
+    ALL, DEFAULT_MAX_WORKERS, DEFAULT_RATE_LIMIT, DEFAULT_RETRIES, DEFAULT_TIMEOUT, SEARCH_PAGE_SIZE,
+)
+from qikfiller.profiles import current_profile
+from qikfiller.utils.api_params import entry_data, list_schemas, search_params
+from qikfiller.utils.fields import resolve_fields
+from qikfiller.utils.trace import trace
+from qikfiller.utils.validation import find_qik_api_key, find_qik_api_url
+
+
+class AsyncQikFiller(object):
+    """
+    ``QikFiller``'s ``load``, ``search`` and ``create`` as coroutines that never block the event loop.
+
+    Requests go through one ``AsyncQikApi``, so however many calls are in flight they share a pool of up to
+    ``max_workers`` connections and the ``rate_limit``. Everything touching the cache (its sqlite session, the
+    resolution index and the http cache) runs on a single worker thread of its own, so concurrent calls queue up
+    there rather than on the loop, and the session is only ever used from one thread.
+
+    Nothing prompts or prints: names have to resolve unambiguously (``UnresolvedFields`` is raised otherwise), and
+    missing credentials raise a ``ValueError``. The arguments are those of ``QikFiller``.
+    """
+
+    def __init__(self, qik_api_key=None, qik_api_url=None, max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT,
+                 http_cache=True, retries=DEFAULT_RETRIES, rate_limit=DEFAULT_RATE_LIMIT, profile_name=None):
+        import_aiohttp()
+        self._profile = current_profile(profile_name)
+        self.qik_api_key = qik_api_key
+        self.qik_api_url = qik_api_url
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._use_http_cache = http_cache
+        self._retries = retries
+        self._rate_limit = rate_limit
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._session = None
+        self._http_cache = None
+        self._api_client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+        return False
+
+    async def _run(self, func, *args):
+        """
+        Call ``func(*args)`` on the cache thread.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _open(self):
+        # On the cache thread
+        if self._session is not None:
+            return
+        session = get_session(self._profile)
+        self.qik_api_key = find_qik_api_key(session, self.qik_api_key)
+        self.qik_api_url = find_qik_api_url(session, self.qik_api_url)
+        if self.qik_api_key is None or self.qik_api_url is None:
+            session.close()
+            raise ValueError('No QikTimes api key and url given, and none stored in the cache of profile {!r}'.format(
+                self._profile))
+        if self._use_http_cache:
+            from qikfiller.api.http_cache import HttpCache
+
+            self._http_cache = HttpCache(session)
+        self._session = session
+
+    async def _api(self):
+        if self._api_client is None:
+            await self._run(self._open)
+            if self._api_client is None:
+                self._api_client = AsyncQikApi(self.qik_api_url, self.qik_api_key, max_workers=self._max_workers,
+                                               timeout=self._timeout, retries=self._retries,
+                                               rate_limit=self._rate_limit)
+        return self._api_client
+
+    async def close(self):
+        if self._api_client is not None:
+            await self._api_client.close()
+            self._api_client = None
+        if self._session is not None:
+            await self._run(self._session.close)
+            self._session = None
+        self._executor.shutdown(wait=False)
+
+    def _conditional_headers(self, schemas):
+        # Left out for lists whose table is empty, as a 304 would leave it so
+        if self._http_cache is None:
+            return {type_: None for type_ in schemas}
+        return {
+            type_: self._http_cache.conditional_headers(list_cache_key(self.qik_api_url, self.qik_api_key, type_),
+                                                        tables[0])
+            for type_, (schema, tables) in schemas.items()
+        }
+
+    def _write_list(self, type_, body):
+        from qikfiller.schemas.lists.fast import FastLoader
+
+        schema, tables = list_schemas()[type_]
+        with trace.phase('schema'):
+            rows = FastLoader(schema).load(json.loads(body.decode('utf-8')))
+        with trace.phase('orm.write'):
+            for table, table_rows in group_loaded(tables[0], rows).items():
+                bulk_upsert(self._session, table, table_rows)
+        return tables
+
+    def _finish_load(self, loaded, responses):
+        reset_sync_state(self._session, loaded)
+        if loaded:
+            refresh_name_search(self._session.connection())
+        if self._http_cache is not None:
+            for type_, response in responses.items():
+                self._http_cache.put(list_cache_key(self.qik_api_url, self.qik_api_key, type_),
+                                     response.url.split('?', 1)[0], response.headers)
+        self._session.commit()
+        if loaded or session_index(self._session) is None:
+            refresh_index(self._session)
+
+    async def load(self):
+        """
+        Reload every list from the QikTimes api into the cache. Lists are written as they arrive, while the others
+        are still downloading, and committed together. Returns the names of the lists that had changed (with the
+        http cache, unchanged lists aren't fetched again).
+        """
+        api = await self._api()
+        headers = await self._run(self._conditional_headers, list_schemas())
+
+        async def fetch(type_):
+            return type_, await api.get_list(type_, headers[type_])
+
+        loaded, responses = [], {}
+        fetches = [asyncio.ensure_future(fetch(type_)) for type_ in headers]
+        try:
+            for future in asyncio.as_completed(fetches):
+                type_, response = await future
+                if response is NOT_MODIFIED:
+                    continue
+                loaded.extend(await self._run(self._write_list, type_, response.content))
+                responses[type_] = response
+            await self._run(self._finish_load, loaded, responses)
+        except BaseException:
+            await self._run(self._session.rollback)
+            raise
+        finally:
+            # Should one fetch (or a write) fail, don't leave the others running with nobody to see how they end
+            for future in fetches:
+                future.cancel()
+            await asyncio.gather(*fetches, return_exceptions=True)
+        return list(responses)
+
+    async def search(self, start=None, end=None, types=ALL, clients=ALL, tasks=ALL, categories=ALL,
+                     page_size=SEARCH_PAGE_SIZE, date_type='created', user='apiuser'):
+        """
+        Async generator of the events matching the filters (as for ``QikFiller.search``), in the order the api
+        returns them, with up to ``max_workers`` pages requested ahead. ``start`` defaults to a week ago and ``end``
+        to today.
+        """
+        api = await self._api()
+        start = start if start is not None else date.today() - timedelta(weeks=1)
+        end = end if end is not None else date.today()
+        params = await self._run(search_params, self._session, start, end, types, clients, tasks, categories,
+                                 page_size, date_type, user)
+        async for entry in api.iter_pages('entries/search.json', params, page_size=page_size, key='entries'):
+            yield entry
+
+    def _entry_data(self, type_, task, category, start, end, duration, date_, description, jira_id, user):
+        from qikfiller.utils.date_time import get_start_end
+
+        date_, start, end = get_start_end(date_, start, end, duration)
+        ids = [resolve_fields(self._session, table, [value])[0]
+               for table, value in ((Type, type_), (Task, task), (Category, category))]
+        return entry_data(self.qik_api_key, *ids, date_=date_, start=start, end=end, description=description,
+                          jira_id=jira_id, user=user)
+
+    async def create(self, type, task, category, start=None, end=None, duration=None, date=0, description='',
+                     jira_id='', user='apiuser', dry=False):
+        """
+        Create a new event (the arguments are those of ``QikFiller.create``), returning the api's ``AsyncResponse``,
+        or with ``dry`` the params that would have been sent. Like ``QikFiller.create``, the request isn't retried,
+        since one that timed out may still have created the event.
+        """
+        api = await self._api()
+        data = await self._run(self._entry_data, type, task, category, start, end, duration, date, description,
+                               jira_id, user)
+        if dry:
+            return data
+        return await api.post('entries.json', params=data)
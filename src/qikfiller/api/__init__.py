@@ -0,0 +1,246 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from hashlib import sha1
+from time import perf_counter, sleep
+
+import requests
+from requests.adapters import HTTPAdapter
+from six.moves.urllib_parse import urljoin
+
+from qikfiller.api.http_cache import HttpCache
+from qikfiller.api.throttle import TokenBucket, backoff
+from qikfiller.constants import (
+    DEFAULT_MAX_WORKERS, DEFAULT_RATE_LIMIT, DEFAULT_RETRIES, DEFAULT_TIMEOUT, RETRY_BACKOFF, RETRY_MAX_BACKOFF,
+    RETRY_STATUSES,
+)
+from qikfiller.utils.trace import trace
+
+
+def response_size(response, streamed=False):
+    """
+    Length of the response body as sent: its ``Content-Length``, or else (unless it is being streamed, and so hasn't
+    been read yet) the length of the body read.
+    """
+    length = response.headers.get('Content-Length')
+    if length is not None and length.isdigit():
+        return int(length)
+    return 0 if streamed else len(response.content)
+
+
+def page_items(payload, key=None):
+    """
+    The items of one page of results, whether the endpoint returned a bare list or an object holding it under ``key``.
+    """
+    if isinstance(payload, list):
+        return payload
+    if key is None:
+        return []
+    return payload.get(key) or []
+
+
+def retry_after(response):
+    """
+    Seconds the server asked us to wait before retrying (a ``Retry-After`` given in seconds), capped at
+    ``RETRY_MAX_BACKOFF``.
+    """
+    try:
+        return min(float(response.headers.get('Retry-After', 0)), RETRY_MAX_BACKOFF)
+    except ValueError:
+        return 0
+
+
+def list_cache_key(api_url, api_key, type_):
+    """
+    The http cache key of list endpoint ``type_`` (eg 'tasks'), kept apart for each api key.
+    """
+    profile = sha1('{}'.format(api_key).encode('utf-8')).hexdigest()
+    return HttpCache.key(urljoin(api_url, '{}.json'.format(type_)), profile)
+
+
+# Returned in place of a payload when a list endpoint answers a conditional request with 304 Not Modified
+NOT_MODIFIED = object()
+
+
+class QikApi(object):
+    """
+    Client for a QikTimes instance. Every request goes through one keep-alive ``requests.Session`` (with a
+    connection pool sized for ``max_workers`` concurrent requests and gzip negotiated), waits for the
+    ``rate_limit`` (requests per second) token bucket, and is retried with jittered exponential backoff on
+    connection errors, timeouts and retryable (429/5xx) statuses. ``timeout`` is in seconds, or a
+    ``(connect, read)`` pair.
+
+    GETs are retried ``retries`` times by default. POSTs aren't retried unless asked to, since a request that
+    timed out may still have created the entry.
+
+    If given an ``HttpCache``, list endpoints are fetched with conditional requests. The validators of fresh
+    responses are only stored by ``commit_cache``, which should be called once their contents have been written to
+    the cache session, and is committed with them: a failed load never leaves the http cache claiming data the db
+    doesn't have.
+    """
+
+    def __init__(self, api_url, api_key, max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT, http_cache=None,
+                 retries=DEFAULT_RETRIES, rate_limit=DEFAULT_RATE_LIMIT):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.max_workers = max(int(max_workers), 1)
+        self.timeout = tuple(timeout) if isinstance(timeout, (list, tuple)) else timeout
+        self.http_cache = http_cache
+        self.retries = int(retries)
+        self.rate_limiter = TokenBucket(rate_limit, capacity=max(float(rate_limit), self.max_workers))
+        self._pending = {}
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def url(self, path):
+        return urljoin(self.api_url, path)
+
+    def request(self, method, path, params=None, retries=0, **kwargs):
+        """
+        Send a request, retrying up to ``retries`` times. The last response is returned (or the last connection
+        error or timeout raised) once the retries are used up.
+        """
+        params = dict(params or {}, api_key=self.api_key)
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(retries + 1):
+            with trace.phase('http.wait'):
+                self.rate_limiter.acquire()
+            started = perf_counter()
+            try:
+                response = self.session.request(method, self.url(path), params=params, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                trace.request(method, None, 0, perf_counter() - started)
+                if attempt == retries:
+                    raise
+                delay = backoff(attempt, RETRY_BACKOFF, RETRY_MAX_BACKOFF)
+            else:
+                if trace.enabled:
+                    trace.request(method, response.status_code, response_size(response, kwargs.get('stream')),
+                                  perf_counter() - started)
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    return response
+                delay = max(backoff(attempt, RETRY_BACKOFF, RETRY_MAX_BACKOFF), retry_after(response))
+                response.close()
+            with trace.phase('http.wait'):
+                sleep(delay)
+
+    def get(self, path, params=None, retries=None, **kwargs):
+        return self.request('GET', path, params, retries=self.retries if retries is None else retries, **kwargs)
+
+    def post(self, path, params=None, retries=0, **kwargs):
+        return self.request('POST', path, params, retries=retries, **kwargs)
+
+    def _cache_key(self, type_):
+        return list_cache_key(self.api_url, self.api_key, type_)
+
+    def conditional_headers(self, type_, table=None):
+        """
+        The headers to fetch list endpoint ``type_`` with, if its content has changed since the last response, which
+        was loaded into ``table``. Read from the cache session, so only ever on the thread using it.
+        """
+        if self.http_cache is None:
+            return {}
+        return self.http_cache.conditional_headers(self._cache_key(type_), table)
+
+    def _get_list_response(self, type_, headers=None, **kwargs):
+        response = self.get('{}.json'.format(type_), headers=headers, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def _remember(self, type_, response):
+        if self.http_cache is not None:
+            self._pending[type_] = (response.url, response.headers)
+
+    def get_list(self, type_, headers=None):
+        response = self._get_list_response(type_, headers)
+        if response.status_code == 304:
+            return NOT_MODIFIED
+        payload = response.json()
+        self._remember(type_, response)
+        return payload
+
+    def open_list(self, type_, headers=None):
+        """
+        Start fetching a list endpoint without reading its body, so it can be consumed incrementally.
+        """
+        response = self._get_list_response(type_, headers, stream=True)
+        if response.status_code == 304:
+            response.close()
+            return NOT_MODIFIED
+        self._remember(type_, response)
+        return response
+
+    def commit_cache(self):
+        for type_, (url, headers) in list(self._pending.items()):
+            self.http_cache.put(self._cache_key(type_), url.split('?', 1)[0], headers)
+        self._pending.clear()
+
+    def get_lists(self, types, streamed=(), headers=None):
+        """
+        Fetch several list endpoints concurrently, yielding ``(type_, payload)`` in the order they arrive.
+        For types in ``streamed`` the payload is the open (unread) response rather than the parsed JSON.
+        ``headers`` maps types to the conditional headers to send (see ``conditional_headers``), which are otherwise
+        read from the http cache here, before the requests are handed to other threads.
+        """
+        if headers is None:
+            headers = {type_: self.conditional_headers(type_) for type_ in types}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.open_list if type_ in streamed else self.get_list, type_,
+                                headers.get(type_)): type_
+                for type_ in types
+            }
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def get_page(self, path, params, page):
+        response = self.get(path, params=dict(params, page=page))
+        response.raise_for_status()
+        return response.json()
+
+    def iter_pages(self, path, params=None, page_size=1000, key=None):
+        """
+        Yield the items of a paginated endpoint in order, requesting pages of ``page_size`` with up to ``max_workers``
+        of them in flight ahead of the consumer. Stops at the first page shorter than ``page_size``, so no more than
+        ``max_workers`` pages are ever held in memory however many results there are. The first page is requested on
+        its own, and others only once its items have all been consumed, so a consumer that stops within it costs a
+        single request. No page past a short one is requested once it has arrived.
+        """
+        params = dict(params or {}, limit=page_size)
+        # The first page known to be short
+        last_page = None
+
+        def fetch(page):
+            nonlocal last_page
+            payload = self.get_page(path, params, page)
+            if len(page_items(payload, key)) < page_size and (last_page is None or page < last_page):
+                last_page = page
+            return payload
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = deque()
+        next_page = 1
+        in_flight = 1
+        try:
+            while True:
+                while len(pending) < in_flight and (last_page is None or next_page <= last_page):
+                    pending.append(executor.submit(fetch, next_page))
+                    next_page += 1
+                items = page_items(pending.popleft().result(), key)
+                for item in items:
+                    yield item
+                if len(items) < page_size:
+                    return
+                # A full page means there are more, so they are fetched ahead from here on
+                in_flight = self.max_workers
+        finally:
+            for future in pending:
+                future.cancel()
+            # Pages already being fetched aren't needed, so they are left to finish without waiting for them
+            executor.shutdown(wait=False)
@@ -0,0 +1,189 @@
+"""
+asyncio counterpart of ``QikApi``, for use inside an event loop. Needs aiohttp: ``pip install qikfiller[async]``.
+"""
+import asyncio
+import json
+from collections import deque
+from time import perf_counter
+
+from six.moves.urllib_parse import urljoin
+
+from qikfiller.api import NOT_MODIFIED, page_items, response_size, retry_after
+from qikfiller.api.throttle import TokenBucket, backoff
+from qikfiller.constants import (
+    DEFAULT_MAX_WORKERS, DEFAULT_RATE_LIMIT, DEFAULT_RETRIES, DEFAULT_TIMEOUT, RETRY_BACKOFF, RETRY_MAX_BACKOFF,
+    RETRY_STATUSES,
+)
+from qikfiller.utils.trace import trace
+
+
+def import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError('The async client needs aiohttp: pip install qikfiller[async]')
+    return aiohttp
+
+
+class AsyncResponse(object):
+    """
+    What is kept of a response once its body has been read and its connection handed back to the pool. The
+    attributes are named as on a ``requests.Response``.
+    """
+    __slots__ = ('url', 'status_code', 'reason', 'headers', 'content', 'request_info')
+
+    def __init__(self, url, status_code, reason, headers, content, request_info):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.request_info = request_info
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            aiohttp = import_aiohttp()
+            raise aiohttp.ClientResponseError(self.request_info, (), status=self.status_code, message=self.reason,
+                                              headers=self.headers)
+
+    def __repr__(self) -> str:
+        return '<AsyncResponse [{status_code}]>'.format(status_code=self.status_code)
+
+
+class AsyncQikApi(object):
+    """
+    asyncio client for a QikTimes instance, behaving like ``QikApi``: requests share one ``aiohttp.ClientSession``
+    with a pool of up to ``max_workers`` keep-alive connections, wait for the ``rate_limit`` token bucket without
+    blocking the loop, and are retried with jittered exponential backoff on connection errors, timeouts and
+    retryable statuses. POSTs aren't retried unless asked to.
+
+    The session is opened on the first request, inside the running loop, and closed by ``close``. The http cache
+    isn't touched here, as that is cache db access: ``get_list`` takes the conditional headers to send.
+    """
+
+    def __init__(self, api_url, api_key, max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES, rate_limit=DEFAULT_RATE_LIMIT):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.max_workers = max(int(max_workers), 1)
+        self.timeout = tuple(timeout) if isinstance(timeout, (list, tuple)) else timeout
+        self.retries = int(retries)
+        self.rate_limiter = TokenBucket(rate_limit, capacity=max(float(rate_limit), self.max_workers))
+        self._session = None
+
+    def url(self, path):
+        return urljoin(self.api_url, path)
+
+    @property
+    def session(self):
+        if self._session is None:
+            aiohttp = import_aiohttp()
+            connect, read = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_workers),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _acquire(self):
+        while True:
+            wait = self.rate_limiter.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def request(self, method, path, params=None, retries=0, headers=None):
+        """
+        Send a request, retrying up to ``retries`` times, and read its body. The last response is returned (or the
+        last connection error or timeout raised) once the retries are used up.
+        """
+        aiohttp = import_aiohttp()
+        params = dict(params or {}, api_key=self.api_key)
+        for attempt in range(retries + 1):
+            with trace.phase('http.wait'):
+                await self._acquire()
+            started = perf_counter()
+            try:
+                async with self.session.request(method, self.url(path), params=params, headers=headers) as raw:
+                    response = AsyncResponse(str(raw.url), raw.status, raw.reason, raw.headers, await raw.read(),
+                                             raw.request_info)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                trace.request(method, None, 0, perf_counter() - started)
+                if attempt == retries:
+                    raise
+                delay = backoff(attempt, RETRY_BACKOFF, RETRY_MAX_BACKOFF)
+            else:
+                if trace.enabled:
+                    trace.request(method, response.status_code, response_size(response), perf_counter() - started)
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    return response
+                delay = max(backoff(attempt, RETRY_BACKOFF, RETRY_MAX_BACKOFF), retry_after(response))
+            with trace.phase('http.wait'):
+                await asyncio.sleep(delay)
+
+    async def get(self, path, params=None, retries=None, headers=None):
+        return await self.request('GET', path, params, retries=self.retries if retries is None else retries,
+                                  headers=headers)
+
+    async def post(self, path, params=None, retries=0):
+        return await self.request('POST', path, params, retries=retries)
+
+    async def get_list(self, type_, headers=None):
+        """
+        The response of list endpoint ``type_``, with its body unparsed, or ``NOT_MODIFIED`` if conditional
+        ``headers`` were sent and it hasn't changed.
+        """
+        response = await self.get('{}.json'.format(type_), headers=headers)
+        response.raise_for_status()
+        return NOT_MODIFIED if response.status_code == 304 else response
+
+    async def get_page(self, path, params, page):
+        response = await self.get(path, params=dict(params, page=page))
+        response.raise_for_status()
+        return response.json()
+
+    async def iter_pages(self, path, params=None, page_size=1000, key=None):
+        """
+        Async generator of the items of a paginated endpoint in order, with up to ``max_workers`` page requests in
+        flight ahead of the consumer once the first page's items have been consumed (see ``QikApi.iter_pages``). Pages past
+        a short one are cancelled once it has arrived.
+        """
+        params = dict(params or {}, limit=page_size)
+        pending = deque()
+        last_page = None
+
+        async def fetch(page):
+            nonlocal last_page
+            payload = await self.get_page(path, params, page)
+            if len(page_items(payload, key)) < page_size and (last_page is None or page < last_page):
+                last_page = page
+                for requested, future in pending:
+                    if requested > page:
+                        future.cancel()
+            return payload
+
+        next_page = 1
+        in_flight = 1
+        try:
+            while True:
+                while len(pending) < in_flight and (last_page is None or next_page <= last_page):
+                    pending.append((next_page, asyncio.ensure_future(fetch(next_page))))
+                    next_page += 1
+                items = page_items(await pending.popleft()[1], key)
+                for item in items:
+                    yield item
+                if len(items) < page_size:
+                    return
+                # A full page means there are more, so they are fetched ahead from here on
+                in_flight = self.max_workers
+        finally:
+            for _, future in pending:
+                future.cancel()
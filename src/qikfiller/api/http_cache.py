@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from hashlib import sha1
+
+from qikfiller.cache.orm import HttpValidator
+from qikfiller.constants import HTTP_CACHE_TTL
+
+
+class HttpCache(object):
+    """
+    The validators (``ETag``/``Last-Modified``) of the last response seen for each list endpoint url and profile,
+    kept in the ``http_validators`` table of the cache db. Bodies aren't kept: a 304 means the cache db already holds
+    the list, so it is never needed again. As the validators live in the same db as the lists, they are dropped
+    (``init``) or lost (the db deleted) along with them, and ``put`` only takes effect when the session that wrote
+    the lists is committed. Entries older than ``ttl`` seconds are dropped.
+    """
+
+    def __init__(self, session, ttl=HTTP_CACHE_TTL):
+        self.session = session
+        self.ttl = ttl
+
+    @staticmethod
+    def key(url, profile):
+        return sha1('{profile}\n{url}'.format(profile=profile, url=url).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        entry = self.session.query(HttpValidator).get(key)
+        if entry is None:
+            return None
+        if entry.stored_at is None or datetime.utcnow() - entry.stored_at > timedelta(seconds=self.ttl):
+            self.delete(key)
+            return None
+        return entry
+
+    def conditional_headers(self, key, table=None):
+        """
+        The headers asking for the list of ``key`` only if it has changed. None are sent if ``table``, which the list
+        is loaded into, is empty, as a 304 would then leave it so.
+        """
+        entry = self.get(key)
+        headers = {}
+        if entry is None or (table is not None and self.session.query(table.id).first() is None):
+            return headers
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def put(self, key, url, headers):
+        """
+        Store the validators from ``headers`` for ``key``. Nothing is stored if the response had none to send back.
+        """
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not (etag or last_modified):
+            self.delete(key)
+            return
+        self.session.merge(HttpValidator(key=key, url=url, etag=etag, last_modified=last_modified,
+                                         stored_at=datetime.utcnow()))
+
+    def delete(self, key):
+        self.session.query(HttpValidator).filter(HttpValidator.key == key).delete()
+
+    def clear(self):
+        self.session.query(HttpValidator).delete()
@@ -0,0 +1,56 @@
+import random
+import threading
+from time import monotonic, sleep
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket: allows bursts of up to ``capacity`` requests, refilled at ``rate`` tokens a second.
+    A ``rate`` of 0 (or less) disables it.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(self.rate, 1))
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """
+        Take a token if there is one, returning 0, or else return the number of seconds until there will be one
+        without waiting for it.
+        """
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """
+        Take a token, waiting for one if the bucket is empty. Returns the number of seconds waited.
+        """
+        waited = 0
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return waited
+            sleep(wait)
+            waited += wait
+
+
+def backoff(attempt, base, cap):
+    """
+    Exponential backoff with full jitter: a random delay of up to ``base * 2 ** attempt`` seconds (but at most
+    ``cap``), so that concurrent clients retrying after the same failure don't all come back at once.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+from qikfiller.cache.orm import Entry, SyncState
+from qikfiller.cache.upsert import UPSERT_CHUNK_SIZE, bulk_upsert
+
+TIMESTAMP_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M')
+
+
+def parse_timestamp(value):
+    """
+    Parse the timestamps the api returns (``2017-03-01T10:00:00``, optionally with fractions of a second and/or a
+    utc offset, or ``2017-03-01 10:00``). The offset is dropped: entries are kept in the instance's local time.
+    """
+    if not value:
+        return None
+    value = value.replace('T', ' ')[:19]
+    for format_ in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, format_)
+        except ValueError:
+            pass
+    raise ValueError('Unrecognised timestamp {value!r}'.format(value=value))
+
+
+def entry_row(entry):
+    start = parse_timestamp(entry.get('start_time'))
+    end = parse_timestamp(entry.get('end_time'))
+    hours = entry.get('hours')
+    if hours is None and start is not None and end is not None:
+        hours = (end - start).total_seconds() / 3600
+    return {
+        'id': entry['id'],
+        'task_id': entry.get('task_id'),
+        'type_id': entry.get('type_id'),
+        'category_id': entry.get('category_id'),
+        'owner_id': entry.get('owner_id'),
+        'date': start.date() if start is not None else None,
+        'start_time': start,
+        'end_time': end,
+        'hours': float(hours) if hours is not None else None,
+        'description': entry.get('description'),
+        'jira_id': entry.get('jira_id'),
+        'created_at': parse_timestamp(entry.get('created_at')),
+        'updated_at': parse_timestamp(entry.get('updated_at')),
+    }
+
+
+def get_watermark(session):
+    """
+    The latest ``updated_at`` of any cached entry, from which the next ``store_entries`` can carry on.
+    """
+    state = session.query(SyncState).get(Entry.__tablename__)
+    return state.synced_at if state is not None else None
+
+
+def store_entries(session, entries, chunk_size=UPSERT_CHUNK_SIZE):
+    """
+    Upsert ``entries`` (as returned by the search api) into the entries cache a chunk at a time and move the
+    watermark forward to the latest ``updated_at`` seen. Returns the number of entries stored.
+    """
+    watermark = get_watermark(session)
+    count = 0
+    chunk = []
+    for entry in entries:
+        row = entry_row(entry)
+        if row['updated_at'] is not None and (watermark is None or row['updated_at'] > watermark):
+            watermark = row['updated_at']
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            count += bulk_upsert(session, Entry, chunk)
+            chunk = []
+    count += bulk_upsert(session, Entry, chunk)
+    if watermark is not None:
+        session.merge(SyncState(table_name=Entry.__tablename__, synced_at=watermark))
+    return count
@@ -0,0 +1,244 @@
+from collections import OrderedDict
+from itertools import islice
+from os.path import splitext
+
+from qikfiller.cache.orm import Category, Client, Task, Type, User
+from qikfiller.cache.query import connect, record_class
+from qikfiller.cache.report import entry_conditions
+
+EXPORT_CHUNK_SIZE = 50000
+EXPORT_FORMATS = {'npz', 'parquet'}
+
+# Column of each dictionary encoded id, and the table its dictionary is read from
+ENCODED = OrderedDict((
+    ('client', Client),
+    ('task', Task),
+    ('category', Category),
+    ('type', Type),
+    ('user', User),
+))
+MISSING = -1
+
+_CACHED_ENTRIES = """
+SELECT e.id, COALESCE(e.task_id, -1), COALESCE(e.category_id, -1), COALESCE(e.type_id, -1),
+       COALESCE(e.owner_id, -1),
+       COALESCE(CAST(strftime('%s', e.start_time) AS INTEGER), 0),
+       COALESCE(CAST(strftime('%s', e.end_time) AS INTEGER), 0)
+FROM entries e
+"""
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('Exporting entries needs numpy: pip install qikfiller[export]')
+    return numpy
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Exporting entries to parquet needs pyarrow: pip install qikfiller[parquet]')
+    return pyarrow
+
+
+class Dictionary(object):
+    """
+    The sorted ids and matching names of one cached table, to encode ids as positions into.
+    """
+
+    def __init__(self, ids, names):
+        self.ids = ids
+        self.names = names
+
+    @classmethod
+    def load(cls, connection, table):
+        np = import_numpy()
+        rows = connection.execute('SELECT id, name FROM {} ORDER BY id'.format(table.__tablename__)).fetchall()
+        return cls(np.array([id_ for id_, _ in rows], dtype=np.int64), [name or '' for _, name in rows])
+
+    def encode(self, ids):
+        """
+        Positions of ``ids`` in the dictionary, with ``MISSING`` for ids the cache doesn't know.
+        """
+        np = import_numpy()
+        if not len(self.ids):
+            return np.full(len(ids), MISSING, dtype=np.int32)
+        codes = np.searchsorted(self.ids, ids).clip(0, len(self.ids) - 1)
+        return np.where(self.ids[codes] == ids, codes, MISSING).astype(np.int32)
+
+    def label(self, code):
+        return self.names[code] if code != MISSING else None
+
+
+class EntryColumns(object):
+    """
+    Entries as numpy arrays: ``id``, ``start``/``end`` (``datetime64[s]``), ``date`` (``datetime64[D]``), ``hours``
+    and a dictionary encoded (``int32`` positions into ``dictionaries``) column for each of ``ENCODED``.
+    """
+
+    def __init__(self, columns, dictionaries):
+        self.columns = columns
+        self.dictionaries = dictionaries
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_array(cls, array, connection):
+        """
+        Build the columns from an ``(n, 7)`` int64 array of id, task, category, type, user, start, end
+        (the last two in seconds since the epoch).
+        """
+        np = import_numpy()
+        dictionaries = OrderedDict((name, Dictionary.load(connection, table)) for name, table in ENCODED.items())
+        start = array[:, 5].astype('datetime64[s]')
+        end = array[:, 6].astype('datetime64[s]')
+
+        columns = OrderedDict()
+        columns['id'] = array[:, 0].copy()
+        columns['date'] = start.astype('datetime64[D]')
+        columns['start'] = start
+        columns['end'] = end
+        columns['hours'] = (array[:, 6] - array[:, 5]) / 3600.0
+        tasks = dictionaries['task'].encode(array[:, 1])
+        # The client of every task, in the same order as the task dictionary, with a trailing MISSING for tasks
+        # the cache doesn't know (which index it as -1)
+        task_clients = dictionaries['client'].encode(np.array(
+            [client_id or MISSING for client_id, in connection.execute('SELECT root_client_id FROM tasks ORDER BY id')]
+            + [MISSING], dtype=np.int64))
+        columns['client'] = task_clients[tasks]
+        columns['task'] = tasks
+        for i, name in enumerate(('category', 'type', 'user'), 2):
+            columns[name] = dictionaries[name].encode(array[:, i])
+        return cls(columns, dictionaries)
+
+    def rollup(self, by):
+        """
+        Total hours and number of entries for each combination of the encoded columns in ``by`` that has any,
+        computed with ``bincount`` over the combined codes.
+        """
+        np = import_numpy()
+        unknown = [name for name in by if name not in self.dictionaries]
+        if unknown:
+            raise ValueError('Cannot roll up by {unknown}. One of: {known}'.format(
+                unknown=', '.join(unknown), known=', '.join(self.dictionaries)))
+        # Shift codes up by one so that MISSING gets a slot of its own
+        codes = [self.columns[name] + 1 for name in by]
+        shape = tuple(len(self.dictionaries[name].ids) + 1 for name in by)
+        keys = np.ravel_multi_index(codes, shape) if by else np.zeros(len(self), dtype=np.int64)
+        # Only the combinations that occur get a bin, however many there could be
+        groups, inverse = np.unique(keys, return_inverse=True)
+        hours = np.bincount(inverse, weights=self.columns['hours'], minlength=len(groups))
+        counts = np.bincount(inverse, minlength=len(groups))
+
+        cls = record_class('rollup', tuple(by) + ('hours', 'entries'))
+        rows = []
+        for i, key in enumerate(groups):
+            labels = [self.dictionaries[name].label(code - 1)
+                      for name, code in zip(by, np.unravel_index(key, shape))] if by else []
+            rows.append(cls(*(labels + [round(float(hours[i]), 2), int(counts[i])])))
+        return sorted(rows, key=lambda row: tuple('' if value is None else str(value) for value in row))
+
+    def to_npz(self, path):
+        np = import_numpy()
+        arrays = dict(self.columns)
+        for name, dictionary in self.dictionaries.items():
+            arrays['{}_ids'.format(name)] = dictionary.ids
+            arrays['{}_names'.format(name)] = np.array(dictionary.names, dtype=str)
+        np.savez_compressed(path, **arrays)
+
+    def to_arrow(self):
+        np = import_numpy()
+        pa = import_pyarrow()
+        arrays = OrderedDict()
+        for name in ('id', 'date', 'start', 'end', 'hours'):
+            arrays[name] = pa.array(self.columns[name])
+        for name, dictionary in self.dictionaries.items():
+            codes = self.columns[name]
+            ids = np.append(dictionary.ids, MISSING)[codes]
+            arrays['{}_id'.format(name)] = pa.array(ids, mask=codes == MISSING)
+            arrays[name] = pa.DictionaryArray.from_arrays(
+                pa.array(codes, mask=codes == MISSING), pa.array(dictionary.names, type=pa.string()))
+        return pa.table(arrays)
+
+    def to_parquet(self, path):
+        import_pyarrow().parquet.write_table(self.to_arrow(), path)
+
+    def write(self, path, format_=None):
+        format_ = format_ or splitext(path)[1].lower().lstrip('.')
+        if format_ not in EXPORT_FORMATS:
+            raise ValueError('Unknown export format {format_}. One of: {formats}'.format(
+                format_=format_, formats=', '.join(sorted(EXPORT_FORMATS))))
+        if format_ == 'npz':
+            self.to_npz(path)
+        else:
+            self.to_parquet(path)
+
+
+def _from_chunks(chunks, connection):
+    np = import_numpy()
+    arrays = [chunk for chunk in chunks if len(chunk)]
+    array = np.concatenate(arrays) if arrays else np.zeros((0, 7), dtype=np.int64)
+    return EntryColumns.from_array(array, connection)
+
+
+def cached_entry_columns(start=None, end=None, clients=None, tasks=None, categories=None, types=None, users=None,
+                         path=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    The entries cache (see ``sync_entries``) between ``start`` and ``end`` matching the filters (as for
+    ``report_rows``) as ``EntryColumns``. Rows are read straight into int64 arrays a chunk at a time, without
+    building any per-entry objects.
+    """
+    np = import_numpy()
+    connection = connect(path)
+    sql = _CACHED_ENTRIES
+    if clients is not None or tasks is not None:
+        sql += 'LEFT JOIN tasks t ON t.id = e.task_id\n'
+    conditions, params = entry_conditions(start, end, clients, tasks, categories, types, users)
+    if conditions:
+        sql += 'WHERE ' + ' AND '.join(conditions)
+    cursor = connection.execute(sql + ' ORDER BY e.start_time', params)
+
+    def chunks():
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield np.array(rows, dtype=np.int64)
+
+    return _from_chunks(chunks(), connection)
+
+
+def _timestamps(values):
+    np = import_numpy()
+    return np.array([(value or '1970-01-01')[:19] for value in values], dtype='datetime64[s]').astype(np.int64)
+
+
+def entry_columns(entries, path=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    ``entries`` as returned by the search api (any iterable of dicts, e.g. ``QikFiller.iter_search``) as
+    ``EntryColumns``, parsing the timestamps of a whole chunk at a time.
+    """
+    np = import_numpy()
+    entries = iter(entries)
+
+    def chunks():
+        while True:
+            chunk = list(islice(entries, chunk_size))
+            if not chunk:
+                return
+            array = np.empty((len(chunk), 7), dtype=np.int64)
+            for i, key in enumerate(('id', 'task_id', 'category_id', 'type_id', 'owner_id')):
+                array[:, i] = [MISSING if entry.get(key) is None else entry[key] for entry in chunk]
+            array[:, 5] = _timestamps(entry.get('start_time') for entry in chunk)
+            array[:, 6] = _timestamps(entry.get('end_time') for entry in chunk)
+            yield array
+
+    return _from_chunks(chunks(), connect(path))
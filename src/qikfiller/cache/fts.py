@@ -0,0 +1,61 @@
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from qikfiller.cache.orm import NAMED_TABLES
+
+FTS_TABLE = 'names_fts'
+# The trigram tokenizer lets fts5 answer LIKE '%x%' (case insensitively) from its index for patterns of 3+ chars
+MIN_QUERY_LENGTH = 3
+LIKE_SPECIAL = '%_\\'
+SEARCH_SQL = 'SELECT row_id FROM {fts} WHERE name LIKE :pattern AND table_name = :table'.format(fts=FTS_TABLE)
+
+
+def create_name_search(connection):
+    """
+    Create the fts5 name search table. Returns ``False`` if this sqlite build has no fts5 (or no trigram tokenizer),
+    in which case name lookups keep using plain ``LIKE`` queries.
+    """
+    try:
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            "table_name UNINDEXED, row_id UNINDEXED, name, tokenize = 'trigram')".format(fts=FTS_TABLE)
+        ))
+    except OperationalError:
+        return False
+    return True
+
+
+def drop_name_search(connection):
+    connection.execute(text('DROP TABLE IF EXISTS {fts}'.format(fts=FTS_TABLE)))
+
+
+def has_name_search(connection):
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': FTS_TABLE}
+    ).first() is not None
+
+
+def refresh_name_search(connection):
+    """
+    Repopulate the name search table from the named tables. Should be called whenever their contents change.
+    """
+    if not has_name_search(connection):
+        return
+    connection.execute(text('DELETE FROM {fts}'.format(fts=FTS_TABLE)))
+    for table in NAMED_TABLES:
+        connection.execute(text(
+            "INSERT INTO {fts} (table_name, row_id, name) SELECT '{table}', id, name FROM {table}".format(
+                fts=FTS_TABLE, table=table.__tablename__)
+        ))
+
+
+def search_names(connection, table, name):
+    """
+    Ids of rows in ``table`` whose name contains ``name`` (case insensitive), or ``None`` if the name search table
+    can't answer the query, in which case the caller should fall back to ``ilike``.
+    """
+    # sqlite only hands a LIKE with no ESCAPE clause to fts5, so names that would need escaping are left to ilike
+    if len(name) < MIN_QUERY_LENGTH or any(char in name for char in LIKE_SPECIAL) or not has_name_search(connection):
+        return None
+    return sorted(row_id for row_id, in connection.execute(
+        text(SEARCH_SQL), {'pattern': '%{}%'.format(name), 'table': table.__tablename__}))
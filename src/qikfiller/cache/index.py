@@ -0,0 +1,71 @@
+from os import remove, stat
+from os.path import exists
+
+from qikfiller.cache.snapshot import InvalidSnapshot, Snapshot, write_snapshot
+from qikfiller.profiles import profile_file
+
+# The index and (inode, modification time) of each index file mapped
+_indexes = {}
+# Where the index was kept before it became a snapshot
+_LEGACY_INDEX = 'index.pickle'
+
+
+def index_path(profile=None):
+    return profile_file('index.snapshot', profile)
+
+
+def _identity(path):
+    st = stat(path)
+    return st.st_ino, st.st_mtime_ns
+
+
+def refresh_index(session, path=None):
+    """
+    Rewrite the resolution index, a snapshot of the cached reference data (see ``cache.snapshot``), next to
+    ``cache.db`` (at ``path``, by default the index of the profile ``session`` is on). Should be called whenever the
+    cached reference data changes.
+    """
+    profile = session.info.get('profile')
+    path = path if path is not None else index_path(profile)
+    write_snapshot(session.connection(), path)
+    index = Snapshot(path)
+    _indexes[path] = (index, _identity(path))
+    legacy = profile_file(_LEGACY_INDEX, profile)
+    if exists(legacy):
+        remove(legacy)
+    return index
+
+
+def clear_index(path=None):
+    path = path if path is not None else index_path()
+    _indexes.pop(path, None)
+    if exists(path):
+        remove(path)
+
+
+def get_index(path=None):
+    """
+    The resolution index (of the current profile, unless given a ``path``), mapped into memory, or ``None`` if the
+    cache hasn't been synced since it was introduced. Remapped if another process (e.g. a ``sync`` next to a
+    running daemon) has replaced it since.
+    """
+    path = path if path is not None else index_path()
+    index, loaded = _indexes.get(path, (None, None))
+    try:
+        identity = _identity(path)
+    except OSError:
+        return index
+    if index is None or identity != loaded:
+        try:
+            index = Snapshot(path)
+        except (InvalidSnapshot, OSError):
+            return None
+        _indexes[path] = (index, identity)
+    return index
+
+
+def session_index(session):
+    """
+    The resolution index of the profile ``session`` is on (see ``get_session``).
+    """
+    return get_index(index_path(session.info.get('profile')))
@@ -0,0 +1,129 @@
+from sqlalchemy import inspect, text
+
+from qikfiller.cache.fts import create_name_search, drop_name_search, refresh_name_search
+from qikfiller.cache.orm import Base, Entry, HttpValidator, OutboxEntry, TASK_PATH_FORMAT, TASK_PATH_SEPARATOR
+
+
+def add_tables(connection):
+    Base.metadata.create_all(connection)
+
+
+def add_task_ancestry(connection):
+    """
+    Add the materialised ancestry columns to tasks and fill them in from the parent/client links.
+    """
+    columns = {column['name'] for column in inspect(connection).get_columns('tasks')}
+    for name, type_ in (('root_client_id', 'INTEGER'), ('depth', 'INTEGER'), ('path', 'VARCHAR')):
+        if name not in columns:
+            connection.execute(text('ALTER TABLE tasks ADD COLUMN {name} {type_}'.format(name=name, type_=type_)))
+
+    links = {id_: (client_id, parent_id) for id_, client_id, parent_id in
+             connection.execute(text('SELECT id, client_id, parent_id FROM tasks'))}
+    ancestry = {}
+
+    def resolve(task_id):
+        chain = []
+        while task_id is not None and task_id not in ancestry:
+            chain.append(task_id)
+            client_id, parent_id = links.get(task_id, (None, None))
+            if client_id is not None:
+                break
+            task_id = parent_id
+        for node in reversed(chain):
+            client_id, parent_id = links[node]
+            path = TASK_PATH_FORMAT.format(node)
+            if client_id is not None or parent_id not in ancestry:
+                ancestry[node] = {'id': node, 'root_client_id': client_id, 'depth': 0, 'path': path}
+            else:
+                parent = ancestry[parent_id]
+                ancestry[node] = {'id': node, 'root_client_id': parent['root_client_id'], 'depth': parent['depth'] + 1,
+                                  'path': TASK_PATH_SEPARATOR.join((parent['path'], path))}
+
+    for task_id in links:
+        resolve(task_id)
+    if ancestry:
+        connection.execute(
+            text('UPDATE tasks SET root_client_id = :root_client_id, depth = :depth, path = :path WHERE id = :id'),
+            list(ancestry.values())
+        )
+
+
+def add_indexes(connection):
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+
+
+def add_name_search(connection):
+    if create_name_search(connection):
+        refresh_name_search(connection)
+
+
+def add_entries(connection):
+    Entry.__table__.create(connection, checkfirst=True)
+
+
+def add_outbox(connection):
+    OutboxEntry.__table__.create(connection, checkfirst=True)
+
+
+def add_http_validators(connection):
+    HttpValidator.__table__.create(connection, checkfirst=True)
+
+
+# Each step upgrades a cache from the version before it. Steps are run in order from the cache's
+# ``PRAGMA user_version``, so new steps must only ever be appended.
+MIGRATIONS = (
+    add_tables,
+    add_task_ancestry,
+    add_indexes,
+    add_name_search,
+    add_entries,
+    add_outbox,
+    add_http_validators,
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(connection):
+    return connection.execute(text('PRAGMA user_version')).scalar()
+
+
+def set_version(connection, version=SCHEMA_VERSION):
+    connection.execute(text('PRAGMA user_version = {:d}'.format(version)))
+
+
+def create_schema(connection):
+    Base.metadata.create_all(connection)
+    create_name_search(connection)
+    set_version(connection)
+
+
+def drop_schema(connection):
+    """
+    Drop everything that can be reloaded from the api, which is everything but the outbox of entries yet to be sent.
+    The http validators go too, so that the next load fetches every list in full.
+    """
+    drop_name_search(connection)
+    Base.metadata.drop_all(connection, tables=[
+        table for table in Base.metadata.sorted_tables if table is not OutboxEntry.__table__
+    ])
+
+
+def migrate(engine):
+    """
+    Upgrade the cache in place to the current schema, or create it from scratch if it is empty.
+    """
+    with engine.begin() as connection:
+        version = get_version(connection)
+        if version >= SCHEMA_VERSION:
+            return
+        if not inspect(connection).get_table_names():
+            create_schema(connection)
+            return
+        for migration in MIGRATIONS[version:]:
+            migration(connection)
+        set_version(connection)
@@ -1,22 +1,44 @@
-from os.path import join
+import threading
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, create_engine
+from sqlalchemy import Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, String, create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import RelationshipProperty, backref, scoped_session, sessionmaker
+from sqlalchemy.orm import RelationshipProperty, backref, sessionmaker
 
-from qikfiller import config_path
-from qikfiller.schemas.lists import register_class
+from qikfiller.profiles import CACHE_DB, current_profile, profile_file
+from qikfiller.schemas import register_class
 
 Base = declarative_base()
 
-db_path = join(config_path, 'cache.db')
+_engines = {}
+_engines_lock = threading.Lock()
 
-engine = create_engine('sqlite:///{db_path}'.format(db_path=db_path))
+
+TASK_PATH_FORMAT = '{:010d}'
+TASK_PATH_SEPARATOR = '/'
+
+# The cache is small, read far more often than it is written, and can always be rebuilt from the api, so it trades
+# durability on power loss (synchronous=NORMAL under WAL) for speed.
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16 * 1024),  # negative means KiB
+    ('mmap_size', 256 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+)
+SQLITE_READ_ONLY_PRAGMAS = ('cache_size', 'mmap_size', 'temp_store')
+
+
+def apply_pragmas(dbapi_connection, connection_record=None, read_only=False):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS:
+        if not read_only or pragma in SQLITE_READ_ONLY_PRAGMAS:
+            cursor.execute('PRAGMA {pragma} = {value}'.format(pragma=pragma, value=value))
+    cursor.close()
 
 
 class Simple(object):
     id = Column(Integer, primary_key=True)
-    name = Column(String)
+    name = Column(String, index=True)
 
     def __repr__(self) -> str:
         return '{self.__class__.__name__}(id={self.id}, name={self.name})'.format(self=self)
@@ -49,16 +71,23 @@ class Task(Base, Simple, HasOwner):
 
     id = Column(Integer, primary_key=True)
     custom_fields = Column(String)
-    archived = Column(Boolean)
+    archived = Column(Boolean, index=True)
     estimated_hours = Column(Integer)
 
-    client_id = Column(Integer, ForeignKey('clients.id'))
-    client = RelationshipProperty('Client')
-    parent_id = Column(Integer, ForeignKey('tasks.id'))
+    client_id = Column(Integer, ForeignKey('clients.id'), index=True)
+    client = RelationshipProperty('Client', foreign_keys=[client_id])
+    parent_id = Column(Integer, ForeignKey('tasks.id'), index=True)
     sub_tasks = RelationshipProperty("Task", backref=backref('parent', remote_side=[id]))
 
+    # Materialised ancestry, filled in at sync time: the client at the top of the tree, the depth below it
+    # and the zero padded ids from the top level task down to this one, so that ordering by path walks the tree.
+    root_client_id = Column(Integer, ForeignKey('clients.id'), index=True)
+    root_client = RelationshipProperty('Client', foreign_keys=[root_client_id])
+    depth = Column(Integer)
+    path = Column(String, index=True)
+
     def get_client(self):
-        return self.client if self.client_id is not None else self.parent.get_client()
+        return self.root_client
 
 
 @register_class
@@ -66,7 +95,7 @@ class Client(Base, Simple, HasOwner):
     __tablename__ = 'clients'
 
     custom_fields = Column(String)
-    tasks = RelationshipProperty('Task')
+    tasks = RelationshipProperty('Task', foreign_keys='Task.client_id')
 
 
 @register_class
@@ -101,5 +130,117 @@ class User(Base, Simple):
     created_at = Column(DateTime)
 
 
-Session = scoped_session(sessionmaker())
-Session.configure(bind=engine)
+class Entry(Base):
+    """
+    A time entry, cached from the search api by ``sync_entries`` so that reports can be run locally.
+    """
+    __tablename__ = 'entries'
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey('tasks.id'), index=True)
+    type_id = Column(Integer, ForeignKey('types.id'))
+    category_id = Column(Integer, ForeignKey('categories.id'))
+    owner_id = Column(Integer, ForeignKey('users.id'))
+    date = Column(Date, index=True)
+    start_time = Column(DateTime)
+    end_time = Column(DateTime)
+    hours = Column(Float)
+    description = Column(String)
+    jira_id = Column(String)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+
+    def __repr__(self) -> str:
+        return 'Entry(id={self.id}, task_id={self.task_id}, date={self.date}, hours={self.hours})'.format(self=self)
+
+
+class SyncState(Base):
+    __tablename__ = 'sync_state'
+
+    table_name = Column(String, primary_key=True)
+    synced_at = Column(DateTime)
+    content_hash = Column(String)
+
+
+class HttpValidator(Base):
+    """
+    The ``ETag``/``Last-Modified`` of the last response of a list endpoint, keyed by ``list_cache_key``, to send back
+    so that it answers 304 if the list hasn't changed. Kept in the cache db, so that they go with the data they vouch
+    for.
+    """
+    __tablename__ = 'http_validators'
+
+    key = Column(String, primary_key=True)
+    url = Column(String)
+    etag = Column(String)
+    last_modified = Column(String)
+    stored_at = Column(DateTime)
+
+
+class RowHash(Base):
+    __tablename__ = 'row_hashes'
+
+    table_name = Column(String, primary_key=True)
+    row_id = Column(Integer, primary_key=True, autoincrement=False)
+    content_hash = Column(String)
+
+
+class OutboxEntry(Base):
+    """
+    An event waiting to be created on the api: queued by ``create --queue`` (or when creating it right away failed)
+    and sent by ``flush``. ``params`` is the JSON of the ``entries.json`` request, sent with ``idempotency_key`` on
+    every attempt. A flush claims the entries it sends until ``claimed_until``, so that two processes never send the
+    same entry at once.
+    """
+    __tablename__ = 'outbox'
+
+    id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String, unique=True)
+    params = Column(String)
+    queued_at = Column(DateTime)
+    attempts = Column(Integer, default=0)
+    last_attempt_at = Column(DateTime)
+    next_attempt_at = Column(DateTime, index=True)
+    last_error = Column(String)
+    failed = Column(Boolean, default=False)
+    claim = Column(String)
+    claimed_until = Column(DateTime)
+
+    def __repr__(self) -> str:
+        return 'OutboxEntry(id={self.id}, attempts={self.attempts}, failed={self.failed})'.format(self=self)
+
+
+NAMED_TABLES = (Category, Client, TagType, Task, Type, User)
+
+Session = sessionmaker()
+
+
+def cache_db_path(profile=None):
+    return profile_file(CACHE_DB, profile)
+
+
+def get_engine(profile=None):
+    """
+    The cache engine of ``profile`` (see ``current_profile``), created (migrating the cache to the current schema) on
+    first use rather than at import time.
+    """
+    profile = current_profile(profile)
+    with _engines_lock:
+        if profile not in _engines:
+            from qikfiller.cache.migrations import migrate
+
+            engine = create_engine('sqlite:///{db_path}'.format(db_path=cache_db_path(profile)))
+            event.listen(engine, 'connect', apply_pragmas)
+            migrate(engine)
+            _engines[profile] = engine
+        return _engines[profile]
+
+
+def get_session(profile=None):
+    """
+    A new session on the cache of ``profile``, which it records in ``session.info['profile']``.
+    """
+    profile = current_profile(profile)
+    session = Session(bind=get_engine(profile))
+    session.info['profile'] = profile
+    return session
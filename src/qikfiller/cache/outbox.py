@@ -0,0 +1,190 @@
+"""
+A durable outbox for ``create``: events are queued in the cache db straight away, and sent later by ``flush`` (or in
+the background by the daemon) in batches, retried with backoff until the api takes them.
+
+Each attempt is a single POST, as for ``create``: a request that timed out may still have created the event, so
+failed sends are left to the outbox's own backoff rather than retried on the spot. Every attempt at an event also
+carries the same ``Idempotency-Key``, so an api that honours it won't create the event twice, though nothing relies
+on it doing so.
+"""
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from sqlalchemy import or_
+
+from qikfiller.cache.orm import OutboxEntry
+from qikfiller.constants import (
+    OUTBOX_BATCH_SIZE, OUTBOX_CLAIM_SECONDS, OUTBOX_MAX_RETRY_DELAY, OUTBOX_RETRY_DELAY,
+    RETRY_STATUSES,
+)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def new_idempotency_key():
+    return uuid4().hex
+
+
+def retry_delay(attempts):
+    """
+    How long to leave an event before the next attempt, after ``attempts`` failed ones.
+    """
+    return timedelta(seconds=min(OUTBOX_MAX_RETRY_DELAY, OUTBOX_RETRY_DELAY * 2 ** max(attempts - 1, 0)))
+
+
+def enqueue(session, data, claim=False):
+    """
+    Queue the ``entries.json`` params ``data``, committing straight away. With ``claim``, the event is claimed (see
+    ``claim_batch``) for the caller to send itself. Returns the queued ``OutboxEntry``.
+    """
+    now = datetime.now()
+    entry = OutboxEntry(
+        idempotency_key=new_idempotency_key(),
+        # The api key is added to every request anyway, so there is no need to keep another copy of it
+        params=json.dumps(OrderedDict((key, value) for key, value in data.items() if key != 'api_key')),
+        queued_at=now,
+        attempts=0,
+        next_attempt_at=now,
+        failed=False,
+        claim=uuid4().hex if claim else None,
+        claimed_until=now + timedelta(seconds=OUTBOX_CLAIM_SECONDS) if claim else None,
+    )
+    session.add(entry)
+    session.commit()
+    return entry
+
+
+def claim_batch(session, size, started, due=True, retry_failed=False):
+    """
+    Claim up to ``size`` queued events not yet attempted since ``started``, oldest first. Only those whose backoff
+    has passed are claimed if ``due``, and those the api rejected only with ``retry_failed``. Events claimed by
+    another flush are skipped until its claim runs out.
+    """
+    now = datetime.now()
+    unclaimed = or_(OutboxEntry.claimed_until.is_(None), OutboxEntry.claimed_until < now)
+    query = session.query(OutboxEntry.id).filter(
+        unclaimed, or_(OutboxEntry.last_attempt_at.is_(None), OutboxEntry.last_attempt_at < started))
+    if due:
+        query = query.filter(OutboxEntry.next_attempt_at <= now)
+    if not retry_failed:
+        query = query.filter(OutboxEntry.failed.isnot(True))
+    ids = [id_ for id_, in query.order_by(OutboxEntry.id).limit(size)]
+    if not ids:
+        return []
+    claim = uuid4().hex
+    # Checking the claim again in the update makes claiming atomic, should another process have picked the same ids
+    session.query(OutboxEntry).filter(OutboxEntry.id.in_(ids), unclaimed).update(
+        {'claim': claim, 'claimed_until': now + timedelta(seconds=OUTBOX_CLAIM_SECONDS)}, synchronize_session=False)
+    session.commit()
+    return session.query(OutboxEntry).filter(OutboxEntry.claim == claim).order_by(OutboxEntry.id).all()
+
+
+def send_batch(api, entries):
+    """
+    POST each of ``entries`` once, with up to ``api.max_workers`` in flight, returning the response (or connection
+    error) of each.
+    """
+    import requests
+
+    payloads = [(json.loads(entry.params), entry.idempotency_key) for entry in entries]
+
+    def send(payload):
+        params, key = payload
+        try:
+            return api.post('entries.json', params=params, retries=0, headers={IDEMPOTENCY_HEADER: key})
+        except requests.RequestException as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=api.max_workers) as executor:
+        return list(executor.map(send, payloads))
+
+
+class OutboxReport(object):
+    def __init__(self):
+        self.sent = []
+        self.retrying = OrderedDict()
+        self.failed = OrderedDict()
+
+    @property
+    def attempted(self):
+        return len(self.sent) + len(self.retrying) + len(self.failed)
+
+    def __str__(self) -> str:
+        lines = ['{sent} sent, {retrying} to retry, {failed} rejected'.format(
+            sent=len(self.sent), retrying=len(self.retrying), failed=len(self.failed))]
+        for label, errors in (('retry', self.retrying), ('rejected', self.failed)):
+            for id_, error in errors.items():
+                lines.append('  {id_:>6} {label}: {error}'.format(id_=id_, label=label, error=error))
+        return '\n'.join(lines)
+
+
+def record_results(session, entries, results, report):
+    """
+    Drop the events the api took, and record the failure of the others: connection errors, timeouts and retryable
+    statuses are tried again after a backoff, anything else is marked as failed until retried by hand.
+    """
+    now = datetime.now()
+    for entry, result in zip(entries, results):
+        entry.attempts = (entry.attempts or 0) + 1
+        entry.last_attempt_at = now
+        entry.claim = entry.claimed_until = None
+        if isinstance(result, Exception):
+            entry.last_error = str(result)
+        elif result.ok:
+            report.sent.append(entry.id)
+            session.delete(entry)
+            continue
+        else:
+            entry.last_error = '{status} {content}'.format(status=result.status_code, content=result.text.strip())
+        if isinstance(result, Exception) or result.status_code in RETRY_STATUSES:
+            entry.failed = False
+            entry.next_attempt_at = now + retry_delay(entry.attempts)
+            report.retrying[entry.id] = entry.last_error
+        else:
+            entry.failed = True
+            report.failed[entry.id] = entry.last_error
+    session.commit()
+
+
+def send_entry(session, api, entry):
+    """
+    Send one just queued and claimed event, as ``create`` does. It is dropped if the api takes it or rejects it
+    outright, and left queued for a later flush if the api couldn't take it. Returns the response (or connection
+    error), and whether the event is still queued.
+    """
+    (result,) = send_batch(api, [entry])
+    report = OutboxReport()
+    record_results(session, [entry], [result], report)
+    if report.failed:
+        session.delete(entry)
+        session.commit()
+    return result, bool(report.retrying)
+
+
+def flush_outbox(session, api, batch_size=OUTBOX_BATCH_SIZE, due=True, retry_failed=False):
+    """
+    Send the queued events a batch of ``batch_size`` at a time (see ``claim_batch`` for ``due`` and
+    ``retry_failed``), each event at most once. Returns an ``OutboxReport``.
+    """
+    started = datetime.now()
+    report = OutboxReport()
+    while True:
+        entries = claim_batch(session, batch_size, started, due=due, retry_failed=retry_failed)
+        if not entries:
+            return report
+        try:
+            results = send_batch(api, entries)
+        except BaseException:
+            # Let them go, rather than leaving them for the claim to run out
+            for entry in entries:
+                entry.claim = entry.claimed_until = None
+            session.commit()
+            raise
+        record_results(session, entries, results, report)
+
+
+def pending_count(session):
+    return session.query(OutboxEntry).filter(OutboxEntry.failed.isnot(True)).count()
@@ -0,0 +1,143 @@
+import sqlite3
+
+from qikfiller.cache.orm import NAMED_TABLES, apply_pragmas, cache_db_path
+from qikfiller.utils.trace import trace
+
+LIST_TABLES = {table.__tablename__: table.__name__ for table in NAMED_TABLES}
+
+_connections = {}
+_record_classes = {}
+_table_columns = {}
+
+
+class Record(object):
+    """
+    A lightweight, read-only row. Rows holding every column print like the ORM's ``Simple`` objects,
+    projected rows print their values separated by pipes.
+    """
+    __slots__ = ()
+    _class_name = None
+    _simple = False
+
+    def __init__(self, *values):
+        for column, value in zip(self.__slots__, values):
+            object.__setattr__(self, column, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('{} is read-only'.format(self.__class__.__name__))
+
+    def __iter__(self):
+        return (getattr(self, column) for column in self.__slots__)
+
+    def _asdict(self):
+        return {column: getattr(self, column) for column in self.__slots__}
+
+    def __repr__(self) -> str:
+        return '{name}({values})'.format(name=self._class_name, values=', '.join(
+            '{}={}'.format(column, getattr(self, column)) for column in self.__slots__))
+
+    def __str__(self) -> str:
+        if self._simple:
+            return '{self.name} | {self.id} ({self._class_name})'.format(self=self)
+        return ' | '.join(str(value) for value in self)
+
+
+def record_class(table_name, columns, simple=False):
+    key = (table_name, columns, simple)
+    if key not in _record_classes:
+        class_name = LIST_TABLES.get(table_name, table_name)
+        _record_classes[key] = type(class_name + 'Record', (Record,), {
+            '__slots__': columns, '_class_name': class_name, '_simple': simple and {'id', 'name'} <= set(columns),
+        })
+    return _record_classes[key]
+
+
+def connect(path=None):
+    """
+    A read-only connection to the cache db at ``path`` (by default, the current profile's), reused between calls.
+    """
+    path = path if path is not None else cache_db_path()
+    if path not in _connections:
+        _connections[path] = sqlite3.connect('file:{path}?mode=ro'.format(path=path), uri=True,
+                                             check_same_thread=False)
+        apply_pragmas(_connections[path], read_only=True)
+        if trace.enabled:
+            # Statements on the raw connection are counted, but not timed
+            _connections[path].set_trace_callback(trace.statement)
+    return _connections[path]
+
+
+def table_columns(connection, table_name):
+    key = (connection, table_name)
+    if key not in _table_columns:
+        exists = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+        if exists.fetchone() is None:
+            raise ValueError('No table named {}'.format(table_name))
+        _table_columns[key] = tuple(row[1] for row in connection.execute(
+            'PRAGMA table_info({})'.format(table_name)))
+    return _table_columns[key]
+
+
+def as_columns(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    return tuple(column.strip() for column in value if column.strip())
+
+
+def select_rows(table_name, columns=None, where=None, name=None, order_by=None, path=None):
+    """
+    Read rows of ``table_name`` straight from sqlite into ``Record`` objects, bypassing the ORM.
+
+    :param columns: Columns to return (a sequence or comma separated string). Default: all of them
+    :param where: Mapping of column to value; rows must match all of them exactly
+    :param name: Only return rows whose name contains this (case insensitive)
+    :param order_by: Columns to sort by (a sequence or comma separated string), prefix with '-' for descending
+    """
+    connection = connect(path)
+    known = table_columns(connection, table_name)
+    projected = as_columns(columns)
+    columns = projected or known
+    order_by = as_columns(order_by) or ()
+    where = dict(where or {})
+
+    unknown = [column for column in list(columns) + [c.lstrip('-') for c in order_by] + list(where)
+               if column not in known]
+    if unknown:
+        raise ValueError('Unknown column(s) for {table}: {columns}. One of: {known}'.format(
+            table=table_name, columns=', '.join(unknown), known=', '.join(known)))
+
+    sql = 'SELECT {columns} FROM {table}'.format(columns=', '.join(columns), table=table_name)
+    conditions = ['{} = ?'.format(column) for column in where]
+    params = list(where.values())
+    if name is not None:
+        conditions.append("name LIKE ? ESCAPE '\\'")
+        params.append('%{}%'.format(escape_like(str(name))))
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    if order_by:
+        sql += ' ORDER BY ' + ', '.join(
+            '{} DESC'.format(column[1:]) if column.startswith('-') else column for column in order_by)
+
+    cls = record_class(table_name, columns, simple=not projected)
+    return [cls(*row) for row in connection.execute(sql, params)]
+
+
+def escape_like(text):
+    """
+    ``text`` escaped for a ``LIKE`` pattern with ``ESCAPE '\\'``, so that ``%`` and ``_`` in it match themselves.
+    """
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def names(table_name, prefix='', path=None):
+    """
+    Names in ``table_name`` starting with ``prefix`` (case insensitive), for shell completion.
+    """
+    connection = connect(path)
+    table_columns(connection, table_name)
+    pattern = escape_like(prefix) + '%'
+    rows = connection.execute(
+        "SELECT name FROM {table} WHERE name LIKE ? ESCAPE '\\' ORDER BY name".format(table=table_name), (pattern,))
+    return [name for name, in rows]
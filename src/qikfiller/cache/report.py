@@ -0,0 +1,102 @@
+from collections import OrderedDict
+
+from qikfiller.cache.orm import TASK_PATH_FORMAT, TASK_PATH_SEPARATOR
+from qikfiller.cache.query import as_columns, connect, record_class
+
+# Width of one task id (plus its separator) in ``tasks.path``
+_PATH_STEP = len(TASK_PATH_FORMAT.format(0)) + len(TASK_PATH_SEPARATOR)
+
+
+def task_rollup(depth):
+    """
+    SQL for the id of the ancestor at ``depth`` of each entry's task (or the task itself if it is shallower), read
+    straight out of the materialised path, so that hours of whole task subtrees are grouped together.
+    """
+    return 'CASE WHEN t.depth > {depth:d} THEN CAST(substr(t.path, {start:d}, {width:d}) AS INTEGER) ELSE t.id END' \
+        .format(depth=depth, start=depth * _PATH_STEP + 1, width=_PATH_STEP - len(TASK_PATH_SEPARATOR))
+
+
+def dimensions(task_depth=0):
+    """
+    The columns a report can be grouped by, as ``name -> (key, label, join)`` SQL fragments.
+    """
+    return OrderedDict((
+        ('client', ('t.root_client_id', 'c.name', 'LEFT JOIN clients c ON c.id = t.root_client_id')),
+        ('task', (task_rollup(task_depth), 'rt.name',
+                  'LEFT JOIN tasks rt ON rt.id = {}'.format(task_rollup(task_depth)))),
+        ('category', ('e.category_id', 'cat.name', 'LEFT JOIN categories cat ON cat.id = e.category_id')),
+        ('type', ('e.type_id', 'ty.name', 'LEFT JOIN types ty ON ty.id = e.type_id')),
+        ('user', ('e.owner_id', 'u.name', 'LEFT JOIN users u ON u.id = e.owner_id')),
+        ('day', ('e.date', 'e.date', None)),
+        ('week', ("date(e.date, 'weekday 0', '-6 days')", "date(e.date, 'weekday 0', '-6 days')", None)),
+        ('month', ("strftime('%Y-%m', e.date)", "strftime('%Y-%m', e.date)", None)),
+    ))
+
+
+def as_ids(value):
+    """
+    Ids from the output of ``validate_field_collection``, or ``None`` for all of them.
+    """
+    if value is None or (isinstance(value, str) and not value.replace(',', '').isdigit()):
+        return None
+    return [int(id_) for id_ in str(value).split(',')]
+
+
+def entry_conditions(start=None, end=None, clients=None, tasks=None, categories=None, types=None, users=None):
+    """
+    ``WHERE`` conditions (and their params) picking the entries (``e``) between ``start`` and ``end`` that match the
+    filters, which are lists of ids or ``None`` for all. ``tasks`` include their sub tasks. The ``clients`` and
+    ``tasks`` conditions need the entry's task joined as ``t``.
+    """
+    conditions, params = [], []
+    if start is not None:
+        conditions.append('e.date >= ?')
+        params.append(start.isoformat())
+    if end is not None:
+        conditions.append('e.date <= ?')
+        params.append(end.isoformat())
+    for column, ids in (('t.root_client_id', clients), ('e.category_id', categories), ('e.type_id', types),
+                        ('e.owner_id', users)):
+        if ids is not None:
+            conditions.append('{column} IN ({marks})'.format(column=column, marks=', '.join('?' * len(ids))))
+            params.extend(ids)
+    if tasks is not None:
+        conditions.append('({})'.format(' OR '.join(
+            "t.path LIKE (SELECT path FROM tasks WHERE id = ?) || '%'" for _ in tasks)))
+        params.extend(tasks)
+    return conditions, params
+
+
+def report_rows(by=('client',), start=None, end=None, clients=None, tasks=None, categories=None, types=None,
+                users=None, task_depth=0, path=None):
+    """
+    Total hours and number of entries in the entries cache, grouped by ``by`` (any of the ``dimensions``), in one
+    ``GROUP BY`` query against the cache.
+
+    ``tasks`` include their sub tasks, and ``task_depth`` picks the level of the task tree hours are rolled up to
+    when grouping by task: 0 for top level tasks, 1 for their sub tasks, and so on.
+    The filters are lists of ids, or ``None`` for all.
+    """
+    by = as_columns(by)
+    available = dimensions(task_depth)
+    unknown = [name for name in by if name not in available]
+    if unknown:
+        raise ValueError('Cannot group a report by {unknown}. One of: {known}'.format(
+            unknown=', '.join(unknown), known=', '.join(available)))
+
+    selected = [available[name] for name in by]
+    conditions, params = entry_conditions(start, end, clients, tasks, categories, types, users)
+    sql = 'SELECT {labels}{comma}ROUND(SUM(e.hours), 2), COUNT(*) FROM entries e ' \
+          'LEFT JOIN tasks t ON t.id = e.task_id {joins}'.format(
+              labels=', '.join(label for _, label, _ in selected),
+              comma=', ' if selected else '',
+              joins=' '.join(join for _, _, join in selected if join))
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    if selected:
+        keys = ', '.join(key for key, _, _ in selected)
+        sql += ' GROUP BY {keys} ORDER BY {labels}'.format(
+            keys=keys, labels=', '.join(label for _, label, _ in selected))
+
+    cls = record_class('report', tuple(by) + ('hours', 'entries'))
+    return [cls(*row) for row in connect(path).execute(sql, params)]
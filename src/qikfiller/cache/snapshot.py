@@ -0,0 +1,253 @@
+"""
+A compact, read-only binary snapshot of the reference data names are resolved against (users, types, categories,
+tag types, clients and the task tree), which processes ``mmap`` and read in place rather than loading.
+
+The file is a directory of named arrays: for each table its sorted ids, its names as one UTF-8 string table with
+an offsets array, and the normalised names as a second, NUL separated string table (which substring searches scan
+with ``mmap.find``), plus the parent and root client of each task. Arrays are in the host's byte order: a snapshot is
+only ever read on the host that wrote it.
+
+Snapshots are replaced atomically, never rewritten in place, so a process keeps a consistent view of the one it
+mapped, and every process on a host shares the same pages of the current one.
+"""
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Mapping
+from os import getpid, remove, replace
+
+from qikfiller.cache.orm import NAMED_TABLES, Task
+
+MAGIC = b'QIKSNAP\x01'
+HEADER = struct.Struct('<8s1s3xI')
+ENTRY = struct.Struct('<32s1s7xQQ')
+ALIGN = 8
+# Stands in for a NULL parent or client
+NO_ID = -1
+
+_BYTE_ORDER = sys.byteorder[0].encode('ascii')
+_CLASS_NAMES = {table.__tablename__: table.__name__ for table in NAMED_TABLES}
+
+
+class InvalidSnapshot(ValueError):
+    pass
+
+
+def normalize(name):
+    return (name or '').lower()
+
+
+def _string_table(strings, separator=b''):
+    offsets = array('q', [0])
+    parts = []
+    position = 0
+    for string in strings:
+        encoded = string.encode('utf-8') + separator
+        parts.append(encoded)
+        position += len(encoded)
+        offsets.append(position)
+    return offsets, b''.join(parts)
+
+
+def snapshot_arrays(connection):
+    """
+    The arrays making up a snapshot of the cache ``connection`` is on, as ``name -> (typecode, data)``.
+    """
+    arrays = OrderedDict()
+    for table in NAMED_TABLES:
+        name = table.__tablename__
+        if table is Task:
+            rows = connection.execute('SELECT id, name, parent_id, root_client_id FROM tasks ORDER BY id').fetchall()
+            arrays['tasks.parent_ids'] = ('q', array('q', [NO_ID if row[2] is None else row[2] for row in rows]))
+            arrays['tasks.client_ids'] = ('q', array('q', [NO_ID if row[3] is None else row[3] for row in rows]))
+        else:
+            rows = connection.execute('SELECT id, name FROM {} ORDER BY id'.format(name)).fetchall()
+        names = [row[1] or '' for row in rows]
+        name_offsets, name_table = _string_table(names)
+        # Names can't contain the separator, so no match can run from one name into the next
+        normalized_offsets, normalized_table = _string_table(
+            (normalize(name).replace('\x00', '') for name in names), separator=b'\x00')
+        arrays[name + '.ids'] = ('q', array('q', [row[0] for row in rows]))
+        arrays[name + '.name_offsets'] = ('q', name_offsets)
+        arrays[name + '.names'] = ('B', name_table)
+        arrays[name + '.normalized_offsets'] = ('q', normalized_offsets)
+        arrays[name + '.normalized'] = ('B', normalized_table)
+    return arrays
+
+
+def _padding(position):
+    return -position % ALIGN
+
+
+def write_snapshot(connection, path):
+    """
+    Write a snapshot of the cache ``connection`` is on to ``path``, atomically replacing any existing one.
+    """
+    arrays = snapshot_arrays(connection)
+    position = HEADER.size + ENTRY.size * len(arrays)
+    entries, chunks = [], []
+    for name, (typecode, data) in arrays.items():
+        data = data.tobytes() if isinstance(data, array) else bytes(data)
+        position += _padding(position)
+        entries.append(ENTRY.pack(name.encode('ascii'), typecode.encode('ascii'), position,
+                                  len(data) // struct.calcsize(typecode)))
+        chunks.append(data)
+        position += len(data)
+
+    temporary = '{path}.{pid}.tmp'.format(path=path, pid=getpid())
+    try:
+        with open(temporary, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, _BYTE_ORDER, len(arrays)))
+            for entry in entries:
+                f.write(entry)
+            for data in chunks:
+                f.write(b'\x00' * _padding(f.tell()))
+                f.write(data)
+        replace(temporary, path)
+    except BaseException:
+        try:
+            remove(temporary)
+        except OSError:
+            pass
+        raise
+
+
+class _Names(Mapping):
+    """
+    The names of one table by id, read from the snapshot on demand.
+    """
+    __slots__ = ('table',)
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, id_):
+        i = self.table.position(id_)
+        if i is None:
+            raise KeyError(id_)
+        return self.table.name_at(i)
+
+    def __contains__(self, id_):
+        return self.table.position(id_) is not None
+
+    def __iter__(self):
+        return iter(self.table.ids)
+
+    def __len__(self):
+        return len(self.table.ids)
+
+
+class TableSnapshot(object):
+    """
+    One table of a snapshot. ``names`` maps ids to names, and ``search`` does a case insensitive substring match
+    (the same thing as ``ilike('%x%')``).
+    """
+
+    def __init__(self, snapshot, table_name):
+        self.table_name = table_name
+        self.class_name = _CLASS_NAMES[table_name]
+        self.ids = snapshot.array(table_name + '.ids')
+        self._name_offsets = snapshot.array(table_name + '.name_offsets')
+        self._names = snapshot.array(table_name + '.names')
+        self._normalized_offsets = snapshot.array(table_name + '.normalized_offsets')
+        self._mmap = snapshot.mmap
+        self._normalized_start = snapshot.offset(table_name + '.normalized')
+        self._normalized_end = self._normalized_start + len(snapshot.array(table_name + '.normalized'))
+        self.names = _Names(self)
+
+    def position(self, id_):
+        if not isinstance(id_, int):
+            return None
+        i = bisect_left(self.ids, id_)
+        return i if i < len(self.ids) and self.ids[i] == id_ else None
+
+    def name_at(self, i):
+        return self._names[self._name_offsets[i]:self._name_offsets[i + 1]].tobytes().decode('utf-8')
+
+    def search(self, query):
+        query = normalize(query).encode('utf-8')
+        if not query:
+            return list(self.ids)
+        if b'\x00' in query:
+            return []
+        ids = []
+        start, end = self._normalized_start, self._normalized_end
+        found = self._mmap.find(query, start, end)
+        while found != -1:
+            i = bisect_right(self._normalized_offsets, found - start) - 1
+            ids.append(self.ids[i])
+            # On to the next name, so each matches once
+            found = self._mmap.find(query, start + self._normalized_offsets[i + 1], end)
+        return ids
+
+    def describe(self, id_):
+        i = self.position(id_)
+        if i is None:
+            return None
+        return '{name} | {id} ({class_name})'.format(name=self.name_at(i), id=id_, class_name=self.class_name)
+
+
+class Snapshot(object):
+    """
+    A snapshot mapped into memory. Its arrays are ``memoryview``s straight onto the mapping, so opening one costs
+    the same however much data it holds.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            try:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise InvalidSnapshot('{path} is empty'.format(path=path))
+        view = memoryview(self.mmap)
+        if len(view) < HEADER.size:
+            raise InvalidSnapshot('{path} is truncated'.format(path=path))
+        magic, byte_order, count = HEADER.unpack_from(view)
+        if magic != MAGIC or byte_order != _BYTE_ORDER:
+            raise InvalidSnapshot('{path} is not a snapshot this version can read'.format(path=path))
+        self._arrays = {}
+        self._offsets = {}
+        for i in range(count):
+            name, typecode, offset, length = ENTRY.unpack_from(view, HEADER.size + i * ENTRY.size)
+            name, typecode = name.rstrip(b'\x00').decode('ascii'), typecode.decode('ascii')
+            end = offset + length * struct.calcsize(typecode)
+            if end > len(view):
+                raise InvalidSnapshot('{path} is truncated'.format(path=path))
+            self._arrays[name] = view[offset:end].cast(typecode)
+            self._offsets[name] = offset
+        try:
+            self.tables = {table.__tablename__: TableSnapshot(self, table.__tablename__) for table in NAMED_TABLES}
+            self._parent_ids = self.array('tasks.parent_ids')
+            self._client_ids = self.array('tasks.client_ids')
+        except KeyError as e:
+            raise InvalidSnapshot('{path} has no {array} array'.format(path=path, array=e.args[0]))
+
+    def array(self, name):
+        return self._arrays[name]
+
+    def offset(self, name):
+        return self._offsets[name]
+
+    def __getitem__(self, table):
+        return self.tables[table.__tablename__]
+
+    def _task_link(self, links, task_id):
+        i = self.tables[Task.__tablename__].position(task_id)
+        if i is None or links[i] == NO_ID:
+            return None
+        return links[i]
+
+    def parent_id(self, task_id):
+        return self._task_link(self._parent_ids, task_id)
+
+    def client_id(self, task_id):
+        """
+        The client at the top of ``task_id``'s tree.
+        """
+        return self._task_link(self._client_ids, task_id)
+
+    def client_name(self, task_id):
+        return self.tables['clients'].names.get(self.client_id(task_id))
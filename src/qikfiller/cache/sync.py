@@ -0,0 +1,192 @@
+import json
+from collections import OrderedDict
+from datetime import datetime
+from hashlib import sha1
+
+from qikfiller.cache.orm import Client, RowHash, SyncState, TASK_PATH_FORMAT, TASK_PATH_SEPARATOR, Task
+from qikfiller.cache.upsert import bulk_upsert
+
+DELETE_CHUNK_SIZE = 500
+
+
+def ancestry(task_id, root_client_id, parent=None):
+    path = TASK_PATH_FORMAT.format(task_id)
+    return {
+        'client_id': root_client_id if parent is None else None,
+        'parent_id': None if parent is None else parent['id'],
+        'root_client_id': root_client_id,
+        'depth': 0 if parent is None else parent['depth'] + 1,
+        'path': path if parent is None else TASK_PATH_SEPARATOR.join((parent['path'], path)),
+    }
+
+
+def flatten_task_row(task, root_client_id, parent=None):
+    sub_tasks = task.pop('sub_tasks', None)
+    task.update(ancestry(task['id'], root_client_id, parent))
+    yield Task, task
+    for sub_task in sub_tasks or []:
+        for table_row in flatten_task_row(sub_task, root_client_id, parent=task):
+            yield table_row
+
+
+def flatten_loaded(table, rows):
+    """
+    Turn the row dicts of ``table`` produced by ``FastLoader`` into ``(table, row)`` pairs, unrolling the
+    client -> task -> sub_task tree into plain rows with their ``client_id``/``parent_id`` links and materialised
+    ancestry (``root_client_id``/``depth``/``path``) filled in. The rows are updated in place.
+    """
+    for row in rows:
+        tasks = row.pop('tasks', None) if table is Client else None
+        yield table, row
+        for task in tasks or []:
+            for table_row in flatten_task_row(task, row['id']):
+                yield table_row
+
+
+def group_loaded(table, rows):
+    tables = OrderedDict()
+    for table_, row in flatten_loaded(table, rows):
+        tables.setdefault(table_, []).append(row)
+    return tables
+
+
+def hash_row(row):
+    return sha1(json.dumps(row, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class TableChanges(object):
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.added = []
+        self.updated = []
+        self.deleted = []
+        self.unchanged = 0
+        self.skipped = False
+        self.not_modified = False
+
+    @property
+    def changed(self):
+        return bool(self.added or self.updated or self.deleted)
+
+    def __str__(self) -> str:
+        if self.not_modified:
+            return '{self.table_name}: not modified'.format(self=self)
+        if self.skipped:
+            return '{self.table_name}: unchanged ({self.unchanged} rows)'.format(self=self)
+        return '{self.table_name}: {added} added, {updated} updated, {deleted} deleted, {self.unchanged} unchanged' \
+            .format(self=self, added=len(self.added), updated=len(self.updated), deleted=len(self.deleted))
+
+
+class SyncReport(object):
+    def __init__(self):
+        self.tables = OrderedDict()
+
+    def add(self, changes):
+        self.tables[changes.table_name] = changes
+
+    @property
+    def changed(self):
+        return any(changes.changed for changes in self.tables.values())
+
+    def __str__(self) -> str:
+        return '\n'.join(str(changes) for changes in self.tables.values())
+
+
+class ProfileSyncResult(object):
+    """
+    How syncing one profile went: its ``SyncReport``, or the ``error`` it failed with, and how long it waited for
+    its host and then took.
+    """
+
+    def __init__(self, profile, host):
+        self.profile = profile
+        self.host = host
+        self.report = None
+        self.error = None
+        self.waited = 0
+        self.seconds = 0
+
+    @property
+    def summary(self):
+        if self.error is not None:
+            return 'failed: {}'.format(self.error)
+        tables = self.report.tables.values()
+        if not self.report.changed:
+            return 'unchanged'
+        return '{added} added, {updated} updated, {deleted} deleted'.format(
+            added=sum(len(changes.added) for changes in tables),
+            updated=sum(len(changes.updated) for changes in tables),
+            deleted=sum(len(changes.deleted) for changes in tables))
+
+
+class ProfilesSyncReport(object):
+    def __init__(self, results, seconds):
+        self.results = results
+        self.seconds = seconds
+
+    def __str__(self) -> str:
+        width = max([len(result.profile) for result in self.results] + [len('profile')])
+        host_width = max([len(result.host or '') for result in self.results] + [len('host')])
+        line = '{:<{width}}  {:<{host_width}}  {:>8}  {:>8}  {}'
+        lines = [line.format('profile', 'host', 'waited', 'took', 'result', width=width, host_width=host_width)]
+        for result in self.results:
+            lines.append(line.format(result.profile, result.host or '', '{:.2f}s'.format(result.waited),
+                                     '{:.2f}s'.format(result.seconds), result.summary, width=width,
+                                     host_width=host_width))
+        failed = sum(1 for result in self.results if result.error is not None)
+        lines.append('Synced {synced} of {total} profiles in {seconds:.2f}s ({busy:.2f}s of syncing), {failed} failed'
+                     .format(synced=len(self.results) - failed, total=len(self.results), seconds=self.seconds,
+                             busy=sum(result.seconds for result in self.results), failed=failed))
+        return '\n'.join(lines)
+
+
+def sync_table(session, table, rows):
+    """
+    Bring ``table`` in line with ``rows`` (the complete upstream contents of the table), only writing rows whose
+    content hash differs from the one recorded at the previous sync.
+    """
+    table_name = table.__tablename__
+    changes = TableChanges(table_name)
+    hashes = OrderedDict((row['id'], hash_row(row)) for row in rows)
+    content_hash = sha1(''.join('{}:{}'.format(*item) for item in hashes.items()).encode('utf-8')).hexdigest()
+
+    state = session.query(SyncState).get(table_name)
+    if state is not None and state.content_hash == content_hash:
+        changes.skipped = True
+        changes.unchanged = len(hashes)
+        return changes
+
+    known = dict(session.query(RowHash.row_id, RowHash.content_hash).filter(RowHash.table_name == table_name))
+    existing = {row_id for row_id, in session.query(table.id)}
+
+    changed_rows = []
+    for row in rows:
+        row_id = row['id']
+        if row_id not in existing:
+            changes.added.append(row_id)
+        elif known.get(row_id) != hashes[row_id]:
+            changes.updated.append(row_id)
+        else:
+            changes.unchanged += 1
+            continue
+        changed_rows.append(row)
+    bulk_upsert(session, table, changed_rows)
+    bulk_upsert(session, RowHash, [
+        {'table_name': table_name, 'row_id': row['id'], 'content_hash': hashes[row['id']]} for row in changed_rows
+    ])
+
+    changes.deleted = sorted((existing | set(known)) - set(hashes))
+    for i in range(0, len(changes.deleted), DELETE_CHUNK_SIZE):
+        chunk = changes.deleted[i:i + DELETE_CHUNK_SIZE]
+        session.query(table).filter(table.id.in_(chunk)).delete(synchronize_session=False)
+        session.query(RowHash).filter(RowHash.table_name == table_name, RowHash.row_id.in_(chunk)) \
+            .delete(synchronize_session=False)
+
+    session.merge(SyncState(table_name=table_name, synced_at=datetime.utcnow(), content_hash=content_hash))
+    return changes
+
+
+def reset_sync_state(session, tables):
+    table_names = [table.__tablename__ for table in tables]
+    session.query(SyncState).filter(SyncState.table_name.in_(table_names)).delete(synchronize_session=False)
+    session.query(RowHash).filter(RowHash.table_name.in_(table_names)).delete(synchronize_session=False)
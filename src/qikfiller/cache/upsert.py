@@ -0,0 +1,40 @@
+from sqlalchemy import bindparam, text
+
+UPSERT_CHUNK_SIZE = 5000
+
+_statements = {}
+
+
+def upsert_statement(table):
+    """
+    Build (and memoise) an ``INSERT ... ON CONFLICT DO UPDATE`` statement for ``table``, keyed on its primary key.
+    """
+    try:
+        return _statements[table]
+    except KeyError:
+        pass
+    columns = list(table.__table__.columns)
+    keys = [column.name for column in columns if column.primary_key]
+    statement = text(
+        'INSERT INTO {table} ({columns}) VALUES ({values}) ON CONFLICT ({keys}) DO UPDATE SET {updates}'.format(
+            table=table.__tablename__,
+            columns=', '.join(column.name for column in columns),
+            values=', '.join(':{}'.format(column.name) for column in columns),
+            keys=', '.join(keys),
+            updates=', '.join('{0} = excluded.{0}'.format(column.name) for column in columns
+                              if column.name not in keys),
+        )
+    ).bindparams(*[bindparam(column.name, type_=column.type) for column in columns])
+    _statements[table] = statement
+    return statement
+
+
+def bulk_upsert(session, table, rows, chunk_size=UPSERT_CHUNK_SIZE):
+    """
+    Insert or update ``rows`` (dicts holding every column of ``table``) with one executemany per chunk.
+    Runs inside the session's current transaction; committing is left to the caller.
+    """
+    statement = upsert_statement(table)
+    for i in range(0, len(rows), chunk_size):
+        session.execute(statement, rows[i:i + chunk_size])
+    return len(rows)
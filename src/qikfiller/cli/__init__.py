@@ -1,142 +1,556 @@
-from datetime import date, datetime, timedelta
-
-import fire
-import requests
-from six.moves.urllib_parse import urljoin
-from sqlalchemy.orm import joinedload
-
-from qikfiller.cache.orm import Base, Category, Client, Profile, Session, TagType, Task, Type, User, engine
-from qikfiller.constants import ALL
-from qikfiller.schemas.lists.categories import CategoriesSchema
-from qikfiller.schemas.lists.client import ClientsSchema
-from qikfiller.schemas.lists.tag_types import TagTypesSchema
-from qikfiller.schemas.lists.types import TypesSchema
-from qikfiller.schemas.lists.user import UsersSchema
-from qikfiller.utils.date_time import get_start_end, parse_date
-from qikfiller.utils.fields import get_field
+import json
+import sys
+from datetime import date, timedelta
+from itertools import islice
+
+from qikfiller.cache.entries import get_watermark, store_entries
+from qikfiller.cache.fts import refresh_name_search
+from qikfiller.cache.index import clear_index, index_path, refresh_index, session_index
+from qikfiller.cache.migrations import create_schema, drop_schema
+from qikfiller.cache.orm import (
+    Category, Client, Profile, TagType, Task, Type, User, cache_db_path, get_engine, get_session,
+)
+from qikfiller.cache.outbox import enqueue, flush_outbox, pending_count, send_entry
+from qikfiller.cache.query import as_columns, connect, names, record_class, select_rows
+from qikfiller.cache.report import as_ids, report_rows
+from qikfiller.cache.sync import (
+    ProfileSyncResult, ProfilesSyncReport, SyncReport, TableChanges, group_loaded, reset_sync_state, sync_table,
+)
+from qikfiller.cache.upsert import bulk_upsert
+from qikfiller.constants import (
+    ALL, DAEMON_REFRESH_INTERVAL, DEFAULT_MAX_WORKERS, DEFAULT_RATE_LIMIT, DEFAULT_RETRIES, DEFAULT_TIMEOUT,
+    ENTRIES_HISTORY_DAYS, OUTBOX_BATCH_SIZE, OUTBOX_FLUSH_INTERVAL, SEARCH_PAGE_SIZE, STREAM_BATCH_SIZE,
+    STREAM_CHUNK_SIZE, SYNC_HOST_CONCURRENCY, SYNC_PROFILE_WORKERS, TASKS_BATCH_SIZE,
+)
+from qikfiller.profiles import current_profile, profile_names
+from qikfiller.utils.api_params import entry_data, list_schemas, search_params
+from qikfiller.utils.fields import UnresolvedFields, get_field, lookup_fields
+from qikfiller.utils.trace import trace, trace_options
 from qikfiller.utils.validation import (
-    validate_date_type, validate_field_collection, validate_limit,
-    validate_qik_api_key, validate_qik_api_url,
+    validate_field_collection, validate_limit, validate_qik_api_key, validate_qik_api_url,
 )
 
+# Network (requests), schema (marshmallow) and date parsing (dateutil) modules are imported inside the commands
+# that need them, so that commands which only read the cache don't pay for importing them.
 
-def get_all_rows(session, table):
-    return session.query(table).all()
+
+def list_rows(table, columns=None, sort=None, name=None, filters=None, path=None):
+    return select_rows(table.__tablename__, columns=columns, where=filters, name=name, order_by=sort, path=path)
 
 
 class QikFiller(object):
     """
     Fill out QikTimesheets... Qikker!
-    """
 
-    def __init__(self, qik_api_key=None, qik_api_url=None):
-        self._session = Session()
-        self.qik_api_key = validate_qik_api_key(self._session, qik_api_key)
-        self.qik_api_url = validate_qik_api_url(self._session, qik_api_url)
+    :param max_workers: Number of concurrent requests to the api
+    :param timeout: Seconds to wait for the api, or a connect,read pair (eg --timeout 5,30)
+    :param http_cache: Use conditional requests to skip refetching lists that haven't changed
+    :param retries: Number of times to retry a failed read (connection error, 429 or 5xx) from the api
+    :param rate_limit: Maximum requests per second to the api. 0 for no limit
+    :param profile: Write timings of the run's phases, api requests and SQL statements as JSON to stderr, or to this
+                    file (eg --profile trace.json). Also enabled by QIKFILLER_TRACE
+    :param cprofile: Also profile the run with cProfile, dumping its stats to this file. Also QIKFILLER_CPROFILE
+    :param profile_name: Named profile (one per QikTimes instance, each with its own cache) to use. Default:
+                         QIKFILLER_PROFILE, or the default profile
+    """
 
-    def _get_data(self, type_):
-        response = requests.get(urljoin(self.qik_api_url, '{}.json'.format(type_)),
-                                params={'api_key': self.qik_api_key}).json()
-        return response
+    def __init__(self, qik_api_key=None, qik_api_url=None, max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT,
+                 http_cache=True, retries=DEFAULT_RETRIES, rate_limit=DEFAULT_RATE_LIMIT, profile=None, cprofile=None,
+                 profile_name=None):
+        trace_output, cprofile = trace_options(profile, cprofile)
+        if trace_output is not None:
+            trace.start(trace_output, cprofile)
+        self._profile = current_profile(profile_name)
+        self._session = get_session(self._profile)
+        # Only checked once a command needs them, so that commands that don't (like sync --all-profiles, which uses
+        # each profile's own) work without them
+        self._qik_api_key = qik_api_key
+        self._qik_api_url = qik_api_url
+        self._credentials_checked = False
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._http_cache = http_cache
+        self._retries = retries
+        self._rate_limit = rate_limit
+        self._api_client = None
+
+    def _check_credentials(self):
+        if not self._credentials_checked:
+            self._qik_api_key = validate_qik_api_key(self._session, self._qik_api_key)
+            self._qik_api_url = validate_qik_api_url(self._session, self._qik_api_url)
+            self._credentials_checked = True
+
+    @property
+    def qik_api_key(self):
+        self._check_credentials()
+        return self._qik_api_key
+
+    @property
+    def qik_api_url(self):
+        self._check_credentials()
+        return self._qik_api_url
+
+    @property
+    def _api(self):
+        if self._api_client is None:
+            from qikfiller.api import QikApi
+            from qikfiller.api.http_cache import HttpCache
+
+            http_cache = HttpCache(self._session) if self._http_cache else None
+            self._api_client = QikApi(self.qik_api_url, self.qik_api_key, max_workers=self._max_workers,
+                                      timeout=self._timeout, http_cache=http_cache, retries=self._retries,
+                                      rate_limit=self._rate_limit)
+        return self._api_client
 
     def init(self):
-        Base.metadata.drop_all(engine)
-        Base.metadata.create_all(engine)
-        profile = Profile(id=1, qik_api_url=self.qik_api_url, qik_api_key=self.qik_api_key)
+        # Read before the schema is dropped, as that takes the credentials stored by an earlier init with it
+        qik_api_key, qik_api_url = self.qik_api_key, self.qik_api_url
+        with get_engine(self._profile).begin() as connection:
+            drop_schema(connection)
+            create_schema(connection)
+        clear_index(index_path(self._profile))
+        profile = Profile(id=1, qik_api_url=qik_api_url, qik_api_key=qik_api_key)
         self._session.add(profile)
         self._session.commit()
         self.load()
         return 'Initialisation successful!'
 
-    def load(self):
-        users = UsersSchema(strict=True).load(self._get_data('users')).data.users
-        for user in users:
-            self._session.merge(user)
-
-        tag_types = TagTypesSchema(strict=True).load(self._get_data('tag_types')).data.tagtypes
-        for tag_type in tag_types:
-            self._session.merge(tag_type)
+    def load(self, stream=False, batch_size=STREAM_BATCH_SIZE):
+        """
+        Reload every list from the QikTimes api into the cache.
 
-        types = TypesSchema(strict=True).load(self._get_data('types')).data.types
-        for type_ in types:
-            self._session.merge(type_)
+        :param stream: Parse tasks.json incrementally, one client at a time, writing to the cache every
+                       ``batch_size`` clients instead of building the whole client/task tree in memory first.
+        :type stream: bool
+        :param batch_size: Number of clients per write when streaming
+        :type batch_size: int
+        """
+        from qikfiller.api import NOT_MODIFIED
+        from qikfiller.schemas.lists.fast import FastLoader
+
+        schemas = list_schemas()
+        streamed = ('tasks',) if stream else ()
+        loaded = []
+        for type_, payload in self._api.get_lists(schemas, streamed=streamed, headers=self._list_headers(schemas)):
+            schema, tables = schemas[type_]
+            if payload is NOT_MODIFIED:
+                print('{type_} not modified'.format(type_=type_))
+                continue
+            if type_ in streamed:
+                self._load_stream(payload, batch_size)
+            else:
+                with trace.phase('schema'):
+                    rows = FastLoader(schema).load(payload)
+                self._write_rows(tables[0], rows)
+            loaded.extend(tables)
+
+        reset_sync_state(self._session, loaded)
+        if loaded:
+            self._refresh_lookups()
+        self._api.commit_cache()
+        self._session.commit()
+        if loaded or session_index(self._session) is None:
+            refresh_index(self._session)
+        print('Successfully loaded data from {api_url}'.format(api_url=self.qik_api_url))
 
-        categories = CategoriesSchema(strict=True).load(self._get_data('categories')).data.categories
-        for category in categories:
-            self._session.merge(category)
+    def _load_stream(self, response, batch_size):
+        from qikfiller.schemas.lists.client import ClientSchema
+        from qikfiller.schemas.lists.fast import ItemLoader
+        from qikfiller.utils.json_stream import iter_array_items
+
+        load_client = ItemLoader(ClientSchema)
+        batch = []
+        try:
+            for client in iter_array_items(response.iter_content(STREAM_CHUNK_SIZE), 'clients'):
+                with trace.phase('schema'):
+                    batch.append(load_client(client))
+                if len(batch) >= batch_size:
+                    self._write_rows(Client, batch)
+                    batch = []
+            self._write_rows(Client, batch)
+        finally:
+            response.close()
+
+    def _list_headers(self, schemas):
+        # The conditional headers of each list, left out for lists whose table is empty
+        return {type_: self._api.conditional_headers(type_, tables[0]) for type_, (schema, tables) in schemas.items()}
+
+    def _refresh_lookups(self):
+        refresh_name_search(self._session.connection())
+
+    def _write_rows(self, table, rows):
+        with trace.phase('orm.write'):
+            for table_, table_rows in group_loaded(table, rows).items():
+                bulk_upsert(self._session, table_, table_rows)
+
+    def sync(self, all_profiles=False, workers=SYNC_PROFILE_WORKERS, per_host=SYNC_HOST_CONCURRENCY):
+        """
+        Incrementally update the cache: only rows that were added, changed or removed upstream since the last
+        sync are written, and tables whose content hasn't changed at all are skipped.
+
+        :param all_profiles: Sync every profile (see ``profiles``) in parallel, and print one report for all of them
+        :type all_profiles: bool
+        :param workers: With --all-profiles, the number of profiles to sync at once
+        :type workers: int
+        :param per_host: With --all-profiles, the number of profiles on the same QikTimes host to sync at once
+        :type per_host: int
+        """
+        if all_profiles:
+            print(self._sync_profiles(profile_names(), workers, per_host))
+            return
+        report = self._sync()
+        print(report)
+        print('Successfully synced data from {api_url}'.format(api_url=self.qik_api_url))
+
+    def _sync(self):
+        from qikfiller.api import NOT_MODIFIED
+        from qikfiller.schemas.lists.fast import FastLoader
+
+        schemas = list_schemas()
+        report = SyncReport()
+        for type_, payload in self._api.get_lists(schemas, headers=self._list_headers(schemas)):
+            schema, tables = schemas[type_]
+            if payload is NOT_MODIFIED:
+                for table in tables:
+                    changes = TableChanges(table.__tablename__)
+                    changes.not_modified = True
+                    report.add(changes)
+                continue
+            with trace.phase('schema'):
+                rows = group_loaded(tables[0], FastLoader(schema).load(payload))
+            for table in tables:
+                with trace.phase('orm.sync'):
+                    report.add(sync_table(self._session, table, rows.get(table, [])))
+
+        if report.changed:
+            self._refresh_lookups()
+        self._api.commit_cache()
+        self._session.commit()
+        if report.changed or session_index(self._session) is None:
+            refresh_index(self._session)
+        return report
+
+    def _sync_profiles(self, profiles, workers, per_host):
+        from concurrent.futures import ThreadPoolExecutor
+        from threading import BoundedSemaphore
+        from time import perf_counter
+
+        from six.moves.urllib_parse import urlsplit
+
+        started = perf_counter()
+        results = []
+        for profile in profiles:
+            session = get_session(profile)
+            stored = session.query(Profile).first()
+            session.close()
+            result = ProfileSyncResult(profile, urlsplit(stored.qik_api_url).netloc if stored is not None else None)
+            if stored is None:
+                result.error = 'not initialised: run qikfiller init --profile-name {}'.format(profile)
+            results.append((result, stored))
+        # Profiles on the same host share its rate limits, so only a few of them are synced against it at once
+        hosts = {result.host: BoundedSemaphore(max(int(per_host), 1)) for result, _ in results}
+
+        def sync_profile(result, stored):
+            waiting = perf_counter()
+            with hosts[result.host]:
+                result.waited = perf_counter() - waiting
+                syncing = perf_counter()
+                try:
+                    qikfiller = QikFiller(stored.qik_api_key, stored.qik_api_url, max_workers=self._max_workers,
+                                          timeout=self._timeout, http_cache=self._http_cache, retries=self._retries,
+                                          rate_limit=self._rate_limit, profile_name=result.profile)
+                    try:
+                        result.report = qikfiller._sync()
+                    finally:
+                        qikfiller._session.close()
+                except Exception as e:
+                    result.error = '{}: {}'.format(e.__class__.__name__, e)
+                result.seconds = perf_counter() - syncing
+
+        with ThreadPoolExecutor(max_workers=max(int(workers), 1)) as executor:
+            for future in [executor.submit(sync_profile, result, stored) for result, stored in results
+                           if result.error is None]:
+                future.result()
+        return ProfilesSyncReport([result for result, _ in results], perf_counter() - started)
+
+    def sync_entries(self, start=None, user=ALL):
+        """
+        Fetch the events created or changed since the last sync_entries into the local entries cache used by
+        ``report``. The first run fetches the last year; pass --start to go further back (or to refetch a period).
 
-        clients = ClientsSchema(strict=True).load(self._get_data('tasks')).data.clients
-        for client in clients:
-            self._session.merge(client)
+        Events deleted upstream are not noticed; re-run ``init`` to start the entries cache over.
 
+        :param start: Fetch events modified on or after this date. Default: since the last sync_entries
+        :type start: str
+        :param user: Only fetch the events of this user
+        :type user: str
+        """
+        from qikfiller.utils.date_time import parse_date
+
+        if start is None:
+            watermark = get_watermark(self._session)
+            start = watermark.date() if watermark is not None else date.today() - timedelta(days=ENTRIES_HISTORY_DAYS)
+        params = self._search_params(start, date.today(), ALL, ALL, ALL, ALL, SEARCH_PAGE_SIZE, 'modified', user)
+        with trace.phase('orm.write'):
+            count = store_entries(self._session, self.iter_search(params))
         self._session.commit()
-        print('Successfully loaded data from {api_url}'.format(api_url=self.qik_api_url))
+        print('Stored {count} events modified since {start:%Y-%m-%d}'.format(count=count, start=parse_date(start)))
+
+    def report(self, by='client', start=None, end=None, clients=ALL, tasks=ALL, categories=ALL, types=ALL, users=ALL,
+               task_depth=0, output=None, format=None):
+        """
+        Total hours from the local entries cache (see ``sync_entries``), grouped by any of client, task, category,
+        type, user, day, week and month.
 
-    def clients(self):
-        return get_all_rows(self._session, Client)
+            qikfiller report --by client,task --start 2017-03-01 --end 2017-03-31
+            qikfiller report --by user,week --clients tea --output march.csv
+
+        :param by: Comma separated columns to group by
+        :type by: str
+        :param start: First day to include. Default: the first of this month
+        :type start: str
+        :param end: Last day to include. Default: today
+        :type end: str
+        :param tasks: Only include these tasks, and their sub tasks
+        :param task_depth: Level of the task tree to roll hours up to when grouping by task: 0 for top level tasks
+        :type task_depth: int
+        :param output: Write the report to this file (csv or jsonl, see ``search``) instead of printing it
+        :type output: str
+        :param format: 'jsonl' or 'csv'. Default: csv for .csv files, jsonl otherwise
+        :type format: str
+        """
+        from qikfiller.utils.date_time import parse_date
+
+        rows = report_rows(
+            by=by,
+            start=parse_date(start) if start is not None else date.today().replace(day=1),
+            end=parse_date(end) if end is not None else date.today(),
+            clients=as_ids(validate_field_collection(self._session, Client, clients)),
+            tasks=as_ids(validate_field_collection(self._session, Task, tasks)),
+            categories=as_ids(validate_field_collection(self._session, Category, categories)),
+            types=as_ids(validate_field_collection(self._session, Type, types)),
+            users=as_ids(validate_field_collection(self._session, User, users)),
+            task_depth=int(task_depth),
+            path=cache_db_path(self._profile),
+        )
+        if output is None:
+            return rows
+        from qikfiller.utils.batch import write_entries
+
+        count = write_entries((row._asdict() for row in rows), output, format)
+        print('Wrote {count} rows to {output}'.format(count=count, output=output))
+
+    def export(self, output=None, by=None, start=None, end=None, clients=ALL, tasks=ALL, categories=ALL, types=ALL,
+               users=ALL, source='cache', format=None, date_type='created'):
+        """
+        Export entries as columns (numpy arrays, or an arrow table) for analysis, and/or roll their hours up.
+        Needs numpy, and pyarrow for parquet.
+
+            qikfiller export --output 2017.parquet --start 2017-01-01 --end 2017-12-31
+            qikfiller export --by client,type --start 2017-03-01
+
+        The ids of clients, tasks, categories, types and users are dictionary encoded against the cache: each is
+        stored as a position into the ids/names of the cached table.
+
+        :param output: .npz or .parquet file to write the entries to
+        :type output: str
+        :param by: Comma separated columns (client, task, category, type, user) to total hours by
+        :type by: str
+        :param start: First day to include. Default: the first of this month
+        :type start: str
+        :param end: Last day to include. Default: today
+        :type end: str
+        :param tasks: Only include these tasks (and, from the cache, their sub tasks)
+        :param source: 'cache' for the entries cache (see ``sync_entries``) or 'search' to fetch them from the api
+        :type source: str
+        :param format: 'npz' or 'parquet'. Default: from the extension of ``output``
+        :type format: str
+        :param date_type: With --source search, whether ``start`` and ``end`` are of the events' 'created' or
+                          'modified' dates (see ``search``)
+        :type date_type: str
+        """
+        from qikfiller.cache.export import cached_entry_columns, entry_columns
+        from qikfiller.utils.date_time import parse_date
+
+        if output is None and by is None:
+            raise ValueError('Please give an --output file to export to and/or columns to total --by')
+        start = parse_date(start) if start is not None else date.today().replace(day=1)
+        end = parse_date(end) if end is not None else date.today()
+        if source == 'cache':
+            columns = cached_entry_columns(
+                start, end,
+                clients=as_ids(validate_field_collection(self._session, Client, clients)),
+                tasks=as_ids(validate_field_collection(self._session, Task, tasks)),
+                categories=as_ids(validate_field_collection(self._session, Category, categories)),
+                types=as_ids(validate_field_collection(self._session, Type, types)),
+                users=as_ids(validate_field_collection(self._session, User, users)),
+                path=cache_db_path(self._profile),
+            )
+        elif source == 'search':
+            user = validate_field_collection(self._session, User, users)
+            params = self._search_params(start, end, types, clients, tasks, categories, SEARCH_PAGE_SIZE, date_type,
+                                         'apiuser' if user == ALL else user)
+            columns = entry_columns(self.iter_search(params), path=cache_db_path(self._profile))
+        else:
+            raise ValueError("Unknown source {source}. One of: cache, search".format(source=source))
+
+        if output is not None:
+            columns.write(output, format)
+            print('Wrote {count} entries to {output}'.format(count=len(columns), output=output))
+        if by is not None:
+            return columns.rollup(as_columns(by))
+
+    def clients(self, columns=None, sort=None, name=None, **filters):
+        """
+        List the cached clients.
+
+            qikfiller clients --name tea --sort=-id --columns id,name,owner_name
+
+        :param columns: Comma separated columns to show. Default: all
+        :param sort: Comma separated columns to sort by. Prefix a column with '-' to sort descending
+        :param name: Only show rows whose name contains this
+        :param filters: Any other --column=value options only show rows with that exact value
+        """
+        return list_rows(Client, columns, sort, name, filters, cache_db_path(self._profile))
 
     def tasks(self):
         """
-        
+        Print every client with its tree of tasks and sub tasks.
         """
-        tasks = self._session.query(Task) \
-            .options(joinedload('client')) \
-            .options(joinedload('parent'))
-        for task in tasks.all():
-            path = [task]
-            t = task
-            while t.client is None:
-                path.insert(0, t.parent)
-                t = t.parent
-            path.insert(0, t.client)
-            indent = ''
-            for p in path:
-                print('{indent}{p}'.format(indent=indent, p=p))
-                indent += '  '
-
-    def users(self):
-        return get_all_rows(self._session, User)
-
-    def categories(self):
-        return get_all_rows(self._session, Category)
-
-    def tag_types(self):
-        return get_all_rows(self._session, TagType)
-
-    def types(self):
-        return get_all_rows(self._session, Type)
-
-    def search(self, start=(date.today() - timedelta(weeks=1)), end=date.today(),
-               types=ALL, clients=ALL, tasks=ALL, categories=ALL,
-               limit=1000, date_type='created', description=None, jira_id=None, user='apiuser', dry=False):
+        tasks = self._session.query(Client.id, Client.name, Task.id, Task.name, Task.depth) \
+            .join(Task, Task.root_client_id == Client.id) \
+            .order_by(Client.name, Client.id, Task.path) \
+            .yield_per(TASKS_BATCH_SIZE)
+        current_client = None
+        for client_id, client_name, task_id, task_name, depth in tasks:
+            if client_id != current_client:
+                print('{name} | {id} (Client)'.format(name=client_name, id=client_id))
+                current_client = client_id
+            print('{indent}{name} | {id} (Task)'.format(indent='  ' * (depth + 1), name=task_name, id=task_id))
+
+    def users(self, columns=None, sort=None, name=None, **filters):
+        """
+        List the cached users. Takes the same options as ``clients``.
+        """
+        return list_rows(User, columns, sort, name, filters, cache_db_path(self._profile))
+
+    def categories(self, columns=None, sort=None, name=None, **filters):
         """
-        At time of writing this, the qiktimes search api is borked and returns 500 errors for all queries.
-        So until that is fixed, this is just a placeholder
+        List the cached categories. Takes the same options as ``clients``.
         """
+        return list_rows(Category, columns, sort, name, filters, cache_db_path(self._profile))
 
-        data = {
-            'api_key': self.qik_api_key,
-            'date_range_from': parse_date(start).strftime('%Y-%m-%d'),
-            'date_range_to': parse_date(end).strftime('%Y-%m-%d'),
-            'rate': validate_field_collection(self._session, Type, types),
-            'client': validate_field_collection(self._session, Client, clients),
-            'task': validate_field_collection(self._session, Task, tasks),
-            'categories': validate_field_collection(self._session, Category, categories),
-            'users': user,
-            'limit': validate_limit(limit),
-            'date_type': validate_date_type(date_type),
-        }
+    def tag_types(self, columns=None, sort=None, name=None, **filters):
+        """
+        List the cached tag types. Takes the same options as ``clients``.
+        """
+        return list_rows(TagType, columns, sort, name, filters, cache_db_path(self._profile))
+
+    def types(self, columns=None, sort=None, name=None, **filters):
+        """
+        List the cached types. Takes the same options as ``clients``.
+        """
+        return list_rows(Type, columns, sort, name, filters, cache_db_path(self._profile))
+
+    def profiles(self):
+        """
+        List the profiles that have a cache and the QikTimes instance each is for. Pick one with --profile-name
+        (or QIKFILLER_PROFILE), and create one with ``qikfiller init --profile-name <name>``.
+        """
+        cls = record_class('profiles', ('name', 'qik_api_url', 'current'))
+        rows = []
+        for profile in profile_names():
+            stored = connect(cache_db_path(profile)).execute('SELECT qik_api_url FROM profiles LIMIT 1').fetchone()
+            rows.append(cls(profile, stored[0] if stored is not None else None, profile == self._profile))
+        return rows
+
+    def complete(self, table, prefix=''):
+        """
+        Print the cached names of ``table`` (types, tasks, clients, categories, users or tag_types) starting with
+        ``prefix``, one per line. Intended for shell completion scripts.
+        """
+        return names(table, prefix, cache_db_path(self._profile))
+
+    def serve(self, refresh_interval=DAEMON_REFRESH_INTERVAL, flush_interval=OUTBOX_FLUSH_INTERVAL):
+        """
+        Run a long lived daemon that keeps the cache session, resolution index and api connection warm.
+
+        While it runs, list commands, ``complete``, ``create``, ``report`` and ``search`` are forwarded to it over a
+        unix socket in the qikfiller config directory. Set QIKFILLER_DAEMON=0 to run a command locally regardless.
+
+        :param refresh_interval: Seconds between background syncs of the cache. 0 disables them.
+        :type refresh_interval: int
+        :param flush_interval: Seconds between background flushes of the outbox (see ``flush``). 0 disables them.
+        :type flush_interval: int
+        """
+        from qikfiller.daemon import serve, socket_path
+
+        session_index(self._session)
+        try:
+            serve(self, path=socket_path(self._profile), refresh_interval=refresh_interval,
+                  flush_interval=flush_interval)
+        except KeyboardInterrupt:
+            print('Stopped')
 
+    def search(self, start=None, end=None,
+               types=ALL, clients=ALL, tasks=ALL, categories=ALL,
+               limit=None, page_size=SEARCH_PAGE_SIZE, date_type='created', description=None, jira_id=None,
+               user='apiuser', output='-', format=None, dry=False):
+        """
+        Search existing events, writing them out as they arrive as JSON Lines or CSV.
+
+        Results are paged through automatically, fetching up to ``--max-workers`` pages at a time, so memory use
+        stays the same however long the date range is.
+
+        :param start: First day to search. Default: a week ago
+        :type start: str
+        :param end: Last day to search. Default: today
+        :type end: str
+        :param limit: Stop after this many events. Default: all of them
+        :type limit: int
+        :param page_size: Number of events per request
+        :type page_size: int
+        :param output: File to write the events to, or '-' for stdout
+        :type output: str
+        :param format: 'jsonl' or 'csv'. Default: csv for .csv files, jsonl otherwise
+        :type format: str
+        """
+        from qikfiller.utils.batch import write_entries
+
+        # Defaulted here rather than in the signature, which is only evaluated once in a long lived daemon
+        start = start if start is not None else date.today() - timedelta(weeks=1)
+        end = end if end is not None else date.today()
+        if limit is not None:
+            limit = validate_limit(limit)
+            # No point fetching pages bigger than the whole result
+            page_size = min(validate_limit(page_size), limit)
+        data = self._search_params(start, end, types, clients, tasks, categories, page_size, date_type, user)
         if dry:
             return data
-        response = requests.get(urljoin(self.qik_api_url, 'entries', 'search.json'), params=data)
-        return response.content
+        entries = self.iter_search(data, page_size)
+        if limit is not None:
+            entries = islice(entries, limit)
+        count = write_entries(entries, output, format)
+        if output != '-':
+            print('Wrote {count} events to {output}'.format(count=count, output=output))
+
+    def _search_params(self, start, end, types, clients, tasks, categories, page_size, date_type, user):
+        return search_params(self._session, start, end, types, clients, tasks, categories, page_size, date_type, user)
+
+    def iter_search(self, params, page_size=SEARCH_PAGE_SIZE):
+        """
+        Generator of the events matching ``params`` (see ``search_params``), in the order the api returns them.
+        """
+        return self._api.iter_pages('entries/search.json', params, page_size=page_size, key='entries')
 
     def create(self, type, task, category, start=None, end=None, duration=None, date=0, description="",
-               jira_id="", user='apiuser', dry=False):
+               jira_id="", user='apiuser', dry=False, queue=False):
         """
         Create a new event.
 
+        The event is saved in the outbox before it is sent, so if the api can't be reached, or fails with a 429 or
+        5xx, it stays queued to be sent by ``flush`` rather than being lost.
+
         Example usage:
         Yesterday we did 2 'Billable' (TYPE id:1) hours of 'Web App Development' (CATEGORY id:31) on the 
         'Resource Planner Feature' (TASK id:27) for 
@@ -203,35 +617,179 @@ class QikFiller(object):
         :type user: str | int
         :param dry: Dry run. Don't actually send the command to the server.
         :type dry: bool
+        :param queue: Queue the event in the outbox and return straight away, without waiting for the api.
+                      Queued events are sent by ``flush``, or in the background by a running daemon.
+        :type queue: bool
         """
+        from qikfiller.utils.date_time import get_start_end
+
         date, start, end = get_start_end(date, start, end, duration)
         type = get_field(self._session, Type, type)
         task = get_field(self._session, Task, task)
         category = get_field(self._session, Category, category)
 
-        data = {
-            'api_key': self.qik_api_key,
-            'entry[start_time]': datetime.combine(date, start).strftime("%Y-%m-%d %H:%M"),
-            'entry[end_time]': datetime.combine(date, end).strftime("%Y-%m-%d %H:%M"),
-            'entry[type_id]': type,
-            'entry[task_id]': task,
-            'entry[category_id]': category,
-            'entry[owner_id]': user,
-            'entry[description]': description,
-            'entry[jira_id]': jira_id,
-        }
+        data = self._entry_data(type, task, category, date, start, end, description, jira_id, user)
 
         if dry:
             return data
+        entry = enqueue(self._session, data, claim=not queue)
+        if not queue:
+            response, queued = send_entry(self._session, self._api, entry)
+            if isinstance(response, Exception):
+                print('Could not reach QikTimes: {error}'.format(error=response))
+            else:
+                print(response.url)
+                print(response.status_code)
+                print(response.content)
+            if not queued:
+                return
+        print('Queued as outbox entry {id} ({pending} waiting). Send with: qikfiller flush'.format(
+            id=entry.id, pending=pending_count(self._session)))
+
+    def flush(self, batch_size=OUTBOX_BATCH_SIZE, due=False, retry_failed=False):
+        """
+        Send the events waiting in the outbox: those queued with ``create --queue``, or because creating them failed.
+
+        Events go out ``batch_size`` at a time, each batch with up to ``--max-workers`` requests in flight. Each event
+        is sent once per flush (a request that timed out may still have created it), with the same idempotency key
+        every time. Events the api couldn't take (connection errors, 429s and 5xx) stay queued and are retried with
+        backoff by later flushes, and those it rejected are kept until ``--retry-failed``.
+
+        :param batch_size: Number of events claimed and sent at a time
+        :type batch_size: int
+        :param due: Only send events whose backoff after a failed attempt has passed, and print nothing if there are
+                    none (what the daemon does in the background)
+        :type due: bool
+        :param retry_failed: Also send the events the api rejected before
+        :type retry_failed: bool
+        """
+        report = flush_outbox(self._session, self._api, batch_size=validate_limit(batch_size), due=due,
+                              retry_failed=retry_failed)
+        if report.attempted or not due:
+            print(report)
+
+    def _entry_data(self, type_id, task_id, category_id, date_, start, end, description, jira_id, user):
+        return entry_data(self.qik_api_key, type_id, task_id, category_id, date_, start, end, description, jira_id,
+                          user)
+
+    def create_batch(self, path='-', format=None, dry=False):
+        """
+        Create many events at once from a CSV (with a header row) or JSON Lines file.
+
+        Each row uses the same fields as ``create``: type, task, category, start, end, duration, date,
+        description, jira_id and user. Every type/task/category is resolved against the cache once up front; values
+        that are unknown or ambiguous fail their rows instead of prompting. Valid rows are then posted concurrently
+        and a per-row report is printed. As with ``create``, each row is posted once: a request that timed out may
+        still have created its event, so failed rows are left for you to check and send again.
+
+            qikfiller create-batch week.csv
+            cat week.jsonl | qikfiller create-batch --format jsonl
+
+        :param path: File to read, or '-' for stdin
+        :type path: str
+        :param format: 'csv' or 'jsonl'. Guessed from the file extension or first line if not given
+        :type format: str
+        :param dry: Dry run. Validate the rows and print what would be sent.
+        :type dry: bool
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        import requests
+
+        from qikfiller.cache.outbox import IDEMPOTENCY_HEADER, new_idempotency_key
+        from qikfiller.utils.batch import is_reference, read_entries
+        from qikfiller.utils.date_time import get_start_end
+
+        rows = read_entries(path, format)
+        references = {}
+        for table, key in ((Type, 'type'), (Task, 'task'), (Category, 'category')):
+            values = [row[key] for row in rows if is_reference(row.get(key))]
+            for value, (id_, error) in lookup_fields(self._session, table, values).items():
+                references[table, value] = ValueError(error) if error is not None else id_
+
+        results = [None] * len(rows)
+        entries = {}
+        for i, row in enumerate(rows):
+            try:
+                ids = []
+                for table, key in ((Type, 'type'), (Task, 'task'), (Category, 'category')):
+                    if key not in row:
+                        raise ValueError('Missing {key}'.format(key=key))
+                    if not is_reference(row[key]):
+                        raise ValueError('{key} must be a name or an id, not {value}'.format(
+                            key=key, value=json.dumps(row[key])))
+                    if isinstance(references[table, row[key]], Exception):
+                        raise references[table, row[key]]
+                    ids.append(references[table, row[key]])
+                date_, start, end = get_start_end(row.get('date', 0), row.get('start'), row.get('end'),
+                                                  row.get('duration'))
+                entries[i] = self._entry_data(*ids, date_=date_, start=start, end=end,
+                                              description=row.get('description', ''),
+                                              jira_id=row.get('jira_id', ''), user=row.get('user', 'apiuser'))
+            except ValueError as e:
+                results[i] = 'ERROR {}'.format(e)
+
+        if dry:
+            for i, data in entries.items():
+                results[i] = 'OK (dry) {}'.format(json.dumps(data, sort_keys=True))
         else:
-            response = requests.post(urljoin(self.qik_api_url, 'entries.json'), params=data)
-            print(response.url)
-            print(response.status_code)
-            print(response.content)
+            with ThreadPoolExecutor(max_workers=self._api.max_workers) as executor:
+                futures = {
+                    executor.submit(self._api.post, 'entries.json', params=data, retries=0,
+                                    headers={IDEMPOTENCY_HEADER: new_idempotency_key()}): i
+                    for i, data in entries.items()
+                }
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        response = future.result()
+                    except requests.RequestException as e:
+                        results[i] = 'ERROR {}'.format(e)
+                        continue
+                    status = 'OK' if response.ok else 'ERROR'
+                    results[i] = '{status} {code} {content}'.format(
+                        status=status, code=response.status_code, content=response.text.strip())
+
+        for i, result in enumerate(results, start=1):
+            print('{i:>4}: {result}'.format(i=i, result=result))
+        failed = sum(1 for result in results if result.startswith('ERROR'))
+        print('{ok} of {total} entries {verb}, {failed} failed'.format(
+            ok=len(rows) - failed, total=len(rows), verb='valid' if dry else 'created', failed=failed))
+
+
+def forward_to_daemon(argv):
+    """
+    Hand the command over to a running ``qikfiller serve`` daemon if there is one and it can run it.
+    Returns the exit code, or ``None`` if the command should be run in this process.
+    """
+    from inspect import signature
+
+    from qikfiller.daemon import FORWARDED_COMMANDS, daemon_enabled, forward
+
+    if not argv or argv[0] not in FORWARDED_COMMANDS or not daemon_enabled() or trace_options()[0] is not None:
+        return None
+    constructor_flags = {'--{}'.format(name) for name in signature(QikFiller).parameters} | \
+                        {'--{}'.format(name.replace('_', '-')) for name in signature(QikFiller).parameters}
+    if any(arg.split('=', 1)[0] in constructor_flags for arg in argv):
+        return None
+    response = forward(argv)
+    if response is None:
+        return None
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['code']
 
 
 def main():
+    import fire
+
+    code = forward_to_daemon(sys.argv[1:])
+    if code is not None:
+        sys.exit(code)
     try:
         fire.Fire(QikFiller)
     except (EOFError, KeyboardInterrupt):
         print('Exiting!')
+    except UnresolvedFields as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
@@ -1,2 +1,26 @@
 ALL = 'All'
 VALID_DATE_TYPES = {'created', 'modified'}
+DEFAULT_MAX_WORKERS = 5
+DEFAULT_TIMEOUT = 30
+TASKS_BATCH_SIZE = 1000
+SEARCH_PAGE_SIZE = 1000
+ENTRIES_HISTORY_DAYS = 365
+STREAM_BATCH_SIZE = 50
+STREAM_CHUNK_SIZE = 64 * 1024
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_MAX_BACKOFF = 30
+DEFAULT_RATE_LIMIT = 10
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+HTTP_CACHE_TTL = 7 * 24 * 60 * 60
+DAEMON_CONNECT_TIMEOUT = 0.5
+DAEMON_REFRESH_INTERVAL = 15 * 60
+TRACE_TOP_FUNCTIONS = 25
+SYNC_PROFILE_WORKERS = 4
+SYNC_HOST_CONCURRENCY = 2
+IN_QUERY_BATCH_SIZE = 500
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_FLUSH_INTERVAL = 10
+OUTBOX_RETRY_DELAY = 30
+OUTBOX_MAX_RETRY_DELAY = 60 * 60
+OUTBOX_CLAIM_SECONDS = 5 * 60
@@ -0,0 +1,150 @@
+import io
+import json
+import signal
+import socket
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+from os import chdir, chmod, getcwd, getenv, remove, umask
+from os.path import exists
+from time import time
+
+from qikfiller.constants import DAEMON_CONNECT_TIMEOUT, DAEMON_REFRESH_INTERVAL, OUTBOX_FLUSH_INTERVAL
+from qikfiller.profiles import profile_file
+
+# Commands that only need the cache and an api connection, and don't read files or stdin from the caller. search and
+# export aren't among them: their output can be as big as the date range is long, and the daemon would have to hold
+# all of it (and serve nobody else) until they finished, where run locally they stream it
+FORWARDED_COMMANDS = {
+    'categories', 'clients', 'complete', 'create', 'flush', 'report', 'tag_types', 'tag-types', 'tasks', 'types',
+    'users',
+}
+
+
+def daemon_enabled():
+    return getenv('QIKFILLER_DAEMON', '1').lower() not in ('0', 'false', 'no', 'off')
+
+
+def socket_path(profile=None):
+    """
+    The socket the daemon of ``profile`` listens on: each profile has a daemon of its own.
+    """
+    return profile_file('qikfiller.sock', profile)
+
+
+def connect(path=None):
+    """
+    A socket connected to the daemon listening on ``path`` (by default, the current profile's), or ``None`` if there
+    isn't one.
+    """
+    path = path if path is not None else socket_path()
+    if not exists(path):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(DAEMON_CONNECT_TIMEOUT)
+    try:
+        client.connect(path)
+    except (socket.error, socket.timeout):
+        client.close()
+        return None
+    client.settimeout(None)
+    return client
+
+
+def forward(argv, path=None):
+    """
+    Run ``argv`` on a running ``qikfiller serve`` daemon and return its ``{'stdout', 'stderr', 'code'}`` response,
+    or ``None`` if no daemon is listening on ``path``.
+    """
+    client = connect(path)
+    if client is None:
+        return None
+    try:
+        client.sendall(json.dumps({'argv': list(argv), 'cwd': getcwd()}).encode('utf-8') + b'\n')
+        with client.makefile('rb') as f:
+            line = f.readline()
+    finally:
+        client.close()
+    return json.loads(line.decode('utf-8')) if line else None
+
+
+def run_command(component, argv):
+    import fire
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    code = 0
+    stdin, sys.stdin = sys.stdin, io.StringIO()
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                fire.Fire(component, command=list(argv), name='qikfiller')
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except EOFError:
+                print('\nThe daemon cannot prompt for input; please be more specific, or run with QIKFILLER_DAEMON=0')
+                code = 1
+            except Exception as e:
+                print('{}: {}'.format(e.__class__.__name__, e), file=sys.stderr)
+                code = 1
+    finally:
+        sys.stdin = stdin
+    return {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'code': code}
+
+
+def serve(qikfiller, path=None, refresh_interval=DAEMON_REFRESH_INTERVAL, flush_interval=OUTBOX_FLUSH_INTERVAL):
+    """
+    Serve commands for ``forward`` on a unix socket, reusing one ``QikFiller`` (and with it the cache session,
+    resolution index and pooled api connection) for every request. Requests are handled one at a time. In between,
+    the cache is synced every ``refresh_interval`` seconds and the outbox flushed every ``flush_interval`` seconds
+    (never, if 0).
+    """
+    import socketserver
+
+    path = path if path is not None else socket_path()
+
+    class CommandHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            # So that relative paths (e.g. report --output) are relative to the caller
+            chdir(request.get('cwd') or '/')
+            response = run_command(qikfiller, request['argv'])
+            qikfiller._session.rollback()
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+    def background(argv):
+        response = run_command(qikfiller, argv)
+        qikfiller._session.rollback()
+        print(response['stdout'] + response['stderr'], end='')
+
+    class Server(socketserver.UnixStreamServer):
+        next_refresh = time() + refresh_interval
+        next_flush = time()
+
+        def service_actions(self):
+            if refresh_interval and time() >= self.next_refresh:
+                background(['sync'])
+                self.next_refresh = time() + refresh_interval
+            if flush_interval and time() >= self.next_flush:
+                background(['flush', '--due'])
+                self.next_flush = time() + flush_interval
+
+    running = connect(path)
+    if running is not None:
+        running.close()
+        raise RuntimeError('A qikfiller daemon is already listening on {path}'.format(path=path))
+    if exists(path):
+        remove(path)
+    # Anyone who can connect can create events as this user, so the socket must never exist with looser permissions
+    previous_umask = umask(0o177)
+    try:
+        server = Server(path, CommandHandler)
+    finally:
+        umask(previous_umask)
+    chmod(path, 0o600)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print('Serving on {path}'.format(path=path))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if exists(path):
+            remove(path)
@@ -0,0 +1,60 @@
+"""
+Named profiles, one per QikTimes instance. Each profile has a directory of its own holding its cache db, resolution
+index and daemon socket, so profiles never see each other's data.
+
+The default profile lives directly in ``~/.qikfiller``, where the cache has always been, and named ones in
+``~/.qikfiller/profiles/<name>``. The profile used is the one given (``--profile-name``), else ``QIKFILLER_PROFILE``,
+else the default.
+"""
+import re
+from os import getenv, listdir, makedirs
+from os.path import exists, isdir, join
+
+from qikfiller import config_path
+
+DEFAULT_PROFILE = 'default'
+CACHE_DB = 'cache.db'
+
+profiles_path = join(config_path, 'profiles')
+
+_PROFILE_NAME = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.-]*')
+
+
+def current_profile(name=None):
+    """
+    The name of profile ``name``, or of the profile picked by the environment if it is ``None``.
+    """
+    name = name if name is not None else getenv('QIKFILLER_PROFILE') or DEFAULT_PROFILE
+    name = str(name)
+    if not _PROFILE_NAME.fullmatch(name):
+        raise ValueError('Invalid profile name {name!r}: use letters, digits, "_", "-" and "."'.format(name=name))
+    return name
+
+
+def profile_path(name=None):
+    """
+    The directory of profile ``name`` (see ``current_profile``), created if it doesn't exist yet.
+    """
+    name = current_profile(name)
+    if name == DEFAULT_PROFILE:
+        return config_path
+    path = join(profiles_path, name)
+    if not exists(path):
+        makedirs(path)
+    return path
+
+
+def profile_file(filename, name=None):
+    return join(profile_path(name), filename)
+
+
+def profile_names():
+    """
+    Every profile that has a cache, default first.
+    """
+    names = [DEFAULT_PROFILE] if exists(join(config_path, CACHE_DB)) else []
+    if isdir(profiles_path):
+        names.extend(sorted(name for name in listdir(profiles_path)
+                            if name != DEFAULT_PROFILE and _PROFILE_NAME.fullmatch(name) and
+                            exists(join(profiles_path, name, CACHE_DB))))
+    return names
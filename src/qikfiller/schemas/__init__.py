@@ -0,0 +1,6 @@
+obj_classes = {}
+
+
+def register_class(cls):
+    obj_classes[cls.__name__] = cls
+    return cls
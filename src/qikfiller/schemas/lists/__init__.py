@@ -1,11 +1,6 @@
 from marshmallow import Schema, post_load
 
-obj_classes = {}
-
-
-def register_class(cls):
-    obj_classes[cls.__name__] = cls
-    return cls
+from qikfiller.schemas import obj_classes, register_class  # noqa: F401
 
 
 class BaseSchema(Schema):
@@ -0,0 +1,246 @@
+"""
+A fast path for loading list payloads: the list schemas' fields are compiled once into plain converter functions,
+which turn each item straight into a row dict for its cache table (with nested items kept in lists under their
+field name), instead of going through ``Schema.load`` and building ORM objects.
+
+The converters accept and reject the same values as the marshmallow fields they are compiled from, with the same
+error messages; fields this module doesn't know how to compile (or that carry extra validators, like ``Email``) fall
+back to the field's own ``deserialize``.
+"""
+import gc
+
+from marshmallow import ValidationError, fields
+from marshmallow.utils import is_collection
+
+from qikfiller.schemas import obj_classes
+
+
+def _is_collection(value):
+    # Decoded JSON arrays are always lists, so check for that before the (much slower) general check
+    return type(value) is list or is_collection(value)
+
+
+def _fail(field, key):
+    raise ValidationError(field.error_messages[key])
+
+
+def _item_errors(load, items, nested):
+    """
+    The errors of every item of ``items`` that ``load`` rejects, keyed by index as the schemas report them.
+    """
+    errors = {}
+    for i, item in enumerate(items):
+        try:
+            load(item)
+        except ValidationError as e:
+            if nested and not isinstance(item, dict):
+                # Nested schemas report items that aren't objects at all against the list as a whole
+                errors[i] = {}
+                errors.setdefault('_schema', []).extend(e.messages)
+            else:
+                errors[i] = e.messages
+    return errors
+
+
+def _load_items(load, items, nested=True):
+    try:
+        return [load(item) for item in items]
+    except ValidationError:
+        # Only now are the items gone through again, to report all the bad ones, so that the loop above stays as
+        # fast as it can be
+        raise ValidationError(_item_errors(load, items, nested))
+
+
+def _integer(field):
+    num_type = field.num_type
+
+    def convert(value):
+        try:
+            return num_type(value)
+        except (TypeError, ValueError):
+            _fail(field, 'invalid')
+        except OverflowError:
+            _fail(field, 'too_large')
+
+    return convert
+
+
+def _string(field):
+    def convert(value):
+        if not isinstance(value, str):
+            _fail(field, 'invalid')
+        return value
+
+    return convert
+
+
+def _boolean(field):
+    truthy, falsy = field.truthy, field.falsy
+
+    def convert(value):
+        if not truthy:
+            return bool(value)
+        try:
+            if value in truthy:
+                return True
+            if value in falsy:
+                return False
+        except TypeError:
+            pass
+        _fail(field, 'invalid')
+
+    return convert
+
+
+def _list(field, join):
+    container = compile_field(field.container)
+
+    def convert(value):
+        if not _is_collection(value):
+            _fail(field, 'invalid')
+        items = _load_items(container, value, nested=False)
+        # The Task and Client schemas store their list of custom fields pipe separated
+        return '|'.join(items) if join else items
+
+    return convert
+
+
+def _nested(field):
+    load_item = ItemLoader(type(field.schema))
+
+    def convert(value):
+        if not _is_collection(value):
+            _fail(field, 'type')
+        return _load_items(load_item, value)
+
+    return convert
+
+
+def compile_field(field, join=False):
+    """
+    A function converting a raw value the way ``field.deserialize`` would (raising ``ValidationError`` for bad
+    values), for a value that is present and not ``None``.
+    """
+    if field.validators:
+        return field.deserialize
+    if isinstance(field, fields.Integer):
+        return _integer(field)
+    if type(field) is fields.String:
+        return _string(field)
+    if isinstance(field, fields.Boolean):
+        return _boolean(field)
+    if isinstance(field, fields.List):
+        return _list(field, join)
+    if isinstance(field, fields.Nested) and field.many:
+        return _nested(field)
+    return field.deserialize
+
+
+class ItemLoader(object):
+    """
+    Loads one item of a list (eg a single client) into a row dict holding every column of its table.
+    """
+    _loaders = {}
+
+    def __new__(cls, schema_class):
+        # Memoised per schema, which also ties the knot for self referencing schemas like TaskSchema
+        if schema_class not in cls._loaders:
+            loader = super(ItemLoader, cls).__new__(cls)
+            cls._loaders[schema_class] = loader
+            loader._compile(schema_class)
+        return cls._loaders[schema_class]
+
+    def _compile(self, schema_class):
+        table = obj_classes[schema_class.LOAD_INTO]
+        self.columns = tuple(column.name for column in table.__table__.columns)
+        self.template = dict.fromkeys(self.columns)
+        self.fields = []
+        # What trust() has to do to each field: (name, key, loader for nested items, whether to join a list)
+        self.trusted = []
+        for name, field in schema_class().fields.items():
+            if field.dump_only:
+                continue
+            key = field.load_from or name
+            join = isinstance(field, fields.List) and name in self.columns
+            self.fields.append((name, key, field, compile_field(field, join=join)))
+            nested = ItemLoader(type(field.schema)) if isinstance(field, fields.Nested) else None
+            self.trusted.append((name, key, nested, join))
+
+    def __call__(self, item):
+        if not isinstance(item, dict):
+            raise ValidationError('Invalid input type.')
+        row = self.template.copy()
+        errors = None
+        for name, key, field, convert in self.fields:
+            value = item.get(key, item)
+            if value is item:
+                if field.required:
+                    errors = errors or {}
+                    errors[name] = [field.error_messages['required']]
+                continue
+            if value is None:
+                if not field.allow_none:
+                    errors = errors or {}
+                    errors[name] = [field.error_messages['null']]
+                row[name] = None
+                continue
+            try:
+                row[name] = convert(value)
+            except ValidationError as e:
+                errors = errors or {}
+                errors[name] = e.messages
+        if errors:
+            raise ValidationError(errors)
+        return row
+
+    def trust(self, item):
+        """
+        Load ``item`` without validating it, only joining list fields that are stored pipe separated.
+        """
+        row = self.template.copy()
+        for name, key, nested, join in self.trusted:
+            value = item.get(key)
+            if value is None:
+                continue
+            if nested is not None:
+                value = [nested.trust(child) for child in value]
+            elif join:
+                value = '|'.join(value)
+            row[name] = value
+        return row
+
+
+class FastLoader(object):
+    """
+    Loads a whole list payload (eg ``tasks.json``) for one of the collection schemas into a list of row dicts.
+
+    With ``sample`` set, only the first ``sample`` items are validated and the rest are trusted as they are, apart
+    from joining list fields that are stored pipe separated.
+    """
+
+    def __init__(self, schema_class, sample=None):
+        ((name, field),) = schema_class().fields.items()
+        self.key = field.load_from or name
+        self.load_item = ItemLoader(type(field.schema))
+        self.sample = sample
+
+    def load(self, payload):
+        items = payload.get(self.key)
+        if items is None:
+            return []
+        if not _is_collection(items):
+            raise ValidationError({self.key: ['Invalid type.']})
+        # None of the rows can be part of a reference cycle, but building hundreds of thousands of them sets off
+        # full collections over everything already loaded, which takes about as long as the loading itself
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            if self.sample is None:
+                return _load_items(self.load_item, items)
+            return _load_items(self.load_item, items[:self.sample]) + \
+                [self.load_item.trust(item) for item in items[self.sample:]]
+        except ValidationError as e:
+            raise ValidationError({self.key: e.messages})
+        finally:
+            if enabled:
+                gc.enable()
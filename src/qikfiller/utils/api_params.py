@@ -0,0 +1,61 @@
+"""
+What is sent to and read from the QikTimes api, shared by ``QikFiller`` and ``AsyncQikFiller``.
+"""
+from collections import OrderedDict
+from datetime import datetime
+
+from qikfiller.cache.orm import Category, Client, TagType, Task, Type, User
+from qikfiller.utils.validation import validate_date_type, validate_field_collection, validate_limit
+
+
+def list_schemas():
+    from qikfiller.schemas.lists.categories import CategoriesSchema
+    from qikfiller.schemas.lists.client import ClientsSchema
+    from qikfiller.schemas.lists.tag_types import TagTypesSchema
+    from qikfiller.schemas.lists.types import TypesSchema
+    from qikfiller.schemas.lists.user import UsersSchema
+
+    return OrderedDict([
+        ('users', (UsersSchema, (User,))),
+        ('tag_types', (TagTypesSchema, (TagType,))),
+        ('types', (TypesSchema, (Type,))),
+        ('categories', (CategoriesSchema, (Category,))),
+        ('tasks', (ClientsSchema, (Client, Task))),
+    ])
+
+
+def search_params(session, start, end, types, clients, tasks, categories, page_size, date_type, user):
+    """
+    The params of an ``entries/search.json`` request. Filters are resolved against the cache once, and the same
+    params are sent with every page request.
+    """
+    from qikfiller.utils.date_time import parse_date
+
+    return {
+        'date_range_from': parse_date(start).strftime('%Y-%m-%d'),
+        'date_range_to': parse_date(end).strftime('%Y-%m-%d'),
+        'rate': validate_field_collection(session, Type, types),
+        'client': validate_field_collection(session, Client, clients),
+        'task': validate_field_collection(session, Task, tasks),
+        'categories': validate_field_collection(session, Category, categories),
+        'users': user,
+        'limit': validate_limit(page_size),
+        'date_type': validate_date_type(date_type),
+    }
+
+
+def entry_data(api_key, type_id, task_id, category_id, date_, start, end, description, jira_id, user):
+    """
+    The params of an ``entries.json`` request creating one event.
+    """
+    return {
+        'api_key': api_key,
+        'entry[start_time]': datetime.combine(date_, start).strftime("%Y-%m-%d %H:%M"),
+        'entry[end_time]': datetime.combine(date_, end).strftime("%Y-%m-%d %H:%M"),
+        'entry[type_id]': type_id,
+        'entry[task_id]': task_id,
+        'entry[category_id]': category_id,
+        'entry[owner_id]': user,
+        'entry[description]': description,
+        'entry[jira_id]': jira_id,
+    }
@@ -0,0 +1,95 @@
+import csv
+import json
+import sys
+from os.path import splitext
+
+ENTRY_FIELDS = ('type', 'task', 'category', 'start', 'end', 'duration', 'date', 'description', 'jira_id', 'user')
+FORMATS = {'csv', 'jsonl'}
+
+
+def guess_format(path, first_line):
+    extension = splitext(path)[1].lower().lstrip('.')
+    if extension in FORMATS:
+        return extension
+    if extension in ('json', 'ndjson'):
+        return 'jsonl'
+    return 'jsonl' if first_line.lstrip().startswith('{') else 'csv'
+
+
+def clean_entry(entry):
+    return {key: value for key, value in entry.items() if key in ENTRY_FIELDS and value not in (None, '')}
+
+
+def is_reference(value):
+    """
+    Whether ``value`` can name a type, task or category: a name or an id, rather than a list, object or the like
+    from a JSON row.
+    """
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+
+def read_entries(path='-', format_=None):
+    """
+    Read entry rows (dicts using the argument names of ``QikFiller.create``) from a CSV file with a header row or a
+    JSON Lines file. ``path`` may be ``-`` for stdin; the format is guessed from the extension or the first line.
+    """
+    f = sys.stdin if path == '-' else open(path, newline='')
+    try:
+        lines = iter(f)
+        first_line = next(lines, '')
+        format_ = format_ or guess_format(path, first_line)
+        if format_ not in FORMATS:
+            raise ValueError('Unknown entry format {format_}. One of: {formats}'.format(
+                format_=format_, formats=', '.join(sorted(FORMATS))))
+
+        def all_lines():
+            yield first_line
+            for line in lines:
+                yield line
+
+        if format_ == 'csv':
+            return [clean_entry(row) for row in csv.DictReader(all_lines())]
+        return [clean_entry(json.loads(line)) for line in all_lines() if line.strip()]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+def write_entries(entries, path='-', format_=None):
+    """
+    Write ``entries`` (dicts) to ``path`` (``-`` for stdout) as JSON Lines or CSV, one at a time as they are
+    produced. Unless given, the format is CSV for ``.csv`` files and JSON Lines otherwise.
+    CSV columns are taken from the first entry; nested values are written as JSON.
+    Returns the number of entries written.
+    """
+    if format_ is None:
+        format_ = 'csv' if splitext(path)[1].lower() == '.csv' else 'jsonl'
+    if format_ not in FORMATS:
+        raise ValueError('Unknown entry format {format_}. One of: {formats}'.format(
+            format_=format_, formats=', '.join(sorted(FORMATS))))
+    f = sys.stdout if path == '-' else open(path, 'w', newline='')
+    count = 0
+    try:
+        writer = None
+        for entry in entries:
+            if format_ == 'jsonl':
+                f.write(json.dumps(entry, default=str))
+                f.write('\n')
+            else:
+                if writer is None:
+                    writer = csv.DictWriter(f, fieldnames=list(entry), extrasaction='ignore')
+                    writer.writeheader()
+                writer.writerow({key: csv_value(value) for key, value in entry.items()})
+            count += 1
+    finally:
+        if f is not sys.stdout:
+            f.close()
+        else:
+            f.flush()
+    return count
@@ -1,9 +1,73 @@
+import re
 from datetime import date, datetime, time, timedelta
+from functools import lru_cache
 
-from dateutil.parser import parse
+PARSE_CACHE_SIZE = 1024
+
+MONTHS = {name: number for number, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+RELATIVE_DAYS = {'today': 0, 'yesterday': -1, 'tomorrow': 1}
+
+# 10am, 10:30pm, 10.30 p.m.
+_TWELVE_HOUR = re.compile(r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap])\.?\s*m?\.?', re.IGNORECASE)
+# 13:30, 1:30, 13:30:15, 10
+_TWENTY_FOUR_HOUR = re.compile(r'(\d{1,2})(?::(\d{2})(?::(\d{2}))?)?')
+# 2h, 30m, 1h30m, 1h30, 1.5h, 2 hours, 45 mins
+_DURATION = re.compile(r'(?:(\d+(?:\.\d+)?)\s*h(?:ours?|rs?)?)?\s*(?:(\d+)\s*m(?:in(?:ute)?s?)?)?', re.IGNORECASE)
+# -1, +2, 0
+_OFFSET = re.compile(r'[-+]?\d{1,3}')
+# 2017-03-01, 2017/03/01, 2017-03-01T10:00:00, 20170301
+_ISO_DATE = re.compile(r'(\d{4})[-/](\d{1,2})[-/](\d{1,2})(?:[T ].*)?|(\d{4})(\d{2})(\d{2})')
+# 1/3/2017, 01-03-17, 1/3 (day first)
+_NUMERIC_DATE = re.compile(r'(\d{1,2})[-/.](\d{1,2})(?:[-/.](\d{2}|\d{4}))?')
+# 2feb, 2 Feb 2017, 2-feb-17
+_DAY_MONTH = re.compile(r'(\d{1,2})[\s-]*([a-z]{3})[a-z]*\.?(?:[\s,-]*(\d{2}|\d{4}))?', re.IGNORECASE)
+# feb2, Feb 2 2017, Feb 2, 2017
+_MONTH_DAY = re.compile(r'([a-z]{3})[a-z]*\.?[\s-]*(\d{1,2})(?:st|nd|rd|th)?(?:[\s,-]*(\d{4}))?', re.IGNORECASE)
+
+
+def _dateutil_parse(value, **kwargs):
+    # Only needed for unusual input, so only imported when it is
+    from dateutil.parser import parse
+
+    try:
+        return parse(value, **kwargs)
+    except (ValueError, OverflowError):
+        return None
+
+
+def _year(year, today):
+    if year is None:
+        return today.year
+    year = int(year)
+    return year + 2000 if year < 100 else year
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_time_string(t):
+    t = t.strip()
+    match = _TWELVE_HOUR.fullmatch(t)
+    if match is not None:
+        hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3).lower()
+        if not 1 <= hour <= 12:
+            return None
+        return time(hour % 12 + (12 if meridiem == 'p' else 0), minute)
+    match = _TWENTY_FOUR_HOUR.fullmatch(t)
+    if match is not None:
+        return time(*(int(part or 0) for part in match.groups()))
+    match = _DURATION.fullmatch(t)
+    if match is not None and any(match.groups()):
+        minutes = round(float(match.group(1) or 0) * 60) + int(match.group(2) or 0)
+        return time(*divmod(minutes, 60))
+    parsed = _dateutil_parse(t)
+    return parsed.time() if parsed is not None else None
 
 
 def parse_time(t):
+    """
+    Parse a time of day, or a duration as a time since midnight: ``10am``, ``10:30pm``, ``13:30``, ``1:30``,
+    ``10`` (an hour), ``2h``, ``30m``, ``1h30m``, ``1.5h``. Anything else is left to dateutil.
+    """
     if isinstance(t, time):
         return t
     if isinstance(t, datetime):
@@ -11,45 +75,82 @@ def parse_time(t):
         return t.time()
     if isinstance(t, int):
         return time(t)
-    try:
-        return parse(t).time()
-    except:
+    parsed = None
+    if isinstance(t, str):
+        try:
+            parsed = _parse_time_string(t)
+        except ValueError:
+            # e.g. 25:00 or 10:75
+            pass
+    if parsed is None:
         raise ValueError('Could not parse {} as a time'.format(t))
+    return parsed
 
 
 def to_timedelta(t):
     return datetime.combine(date.min, parse_time(t)) - datetime.min
 
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_date_string(d, today):
+    d = d.strip()
+    if _OFFSET.fullmatch(d):
+        return today + timedelta(days=int(d))
+    if d.lower() in RELATIVE_DAYS:
+        return today + timedelta(days=RELATIVE_DAYS[d.lower()])
+    match = _ISO_DATE.fullmatch(d)
+    if match is not None:
+        return date(*(int(part) for part in match.groups() if part is not None))
+    match = _NUMERIC_DATE.fullmatch(d)
+    if match is not None:
+        day, month, year = match.groups()
+        return date(_year(year, today), int(month), int(day))
+    for pattern, day_group, month_group in ((_DAY_MONTH, 1, 2), (_MONTH_DAY, 2, 1)):
+        match = pattern.fullmatch(d)
+        if match is not None and match.group(month_group).lower() in MONTHS:
+            return date(_year(match.group(3), today), MONTHS[match.group(month_group).lower()],
+                        int(match.group(day_group)))
+    parsed = _dateutil_parse(d, dayfirst=True)
+    return parsed.date() if parsed is not None else None
+
+
 def parse_date(d):
-    if isinstance(d, date):
-        return d
+    """
+    Parse a date: an offset in days from today (``-1``, ``0``, ``+2``), ``today``/``yesterday``/``tomorrow``, an ISO
+    date (``2017-03-01``), a day first date (``1/3/2017``, ``1/3``) or a day and month name (``2feb``,
+    ``2 Feb 2017``, ``Feb 2``). Dates without a year are in the current year. Anything else is left to dateutil.
+    """
     if isinstance(d, datetime):
         # noinspection PyArgumentList
         return d.date()
-    try:
-        return parse(d, dayfirst=True)
-    except (ValueError, TypeError):
-        pass
+    if isinstance(d, date):
+        return d
     if isinstance(d, int):
         return date.today() + timedelta(days=d)
-    raise ValueError('Could not parse {} as a date'.format(d))
+    parsed = None
+    if isinstance(d, str):
+        try:
+            parsed = _parse_date_string(d, date.today())
+        except ValueError:
+            # e.g. 31/2
+            pass
+    if parsed is None:
+        raise ValueError('Could not parse {} as a date'.format(d))
+    return parsed
 
 
 def get_start_end(date_, start, end, duration):
     if start and not any([date_, end, duration]):
         end = datetime.now().time()
     date_ = parse_date(date_)
-    if start and end:
-        start = parse_time(start)
-        end = parse_time(end)
-    elif start and duration:
-        start = parse_time(start)
-        end = (datetime.combine(date_, start) + to_timedelta(parse_time(duration))).time()
-    elif end and duration:
-        end = parse_time(end)
-        start = (datetime.combine(date_, end) - to_timedelta(parse_time(duration))).time()
-    else:
+    start = parse_time(start) if start else None
+    end = parse_time(end) if end else None
+    duration = to_timedelta(duration) if duration else None
+    if start is not None and end is None and duration is not None:
+        end = (datetime.combine(date_, start) + duration).time()
+    elif end is not None and start is None and duration is not None:
+        start = (datetime.combine(date_, end) - duration).time()
+    elif start is None or end is None:
         raise ValueError("Please provide any two of start, end, duration")
     if start > end:
         raise ValueError('Start time {start} is after end time {end}.'.format(start=start, end=end))
@@ -1,14 +1,194 @@
 import sys
+from collections import OrderedDict
 
+from qikfiller.cache.fts import search_names
+from qikfiller.cache.index import session_index
 from qikfiller.cache.orm import Task
+from qikfiller.cache.query import escape_like
+from qikfiller.constants import IN_QUERY_BATCH_SIZE
+from qikfiller.utils.trace import traced
 
 
+class UnresolvedFields(ValueError):
+    """
+    Raised by ``resolve_fields`` for every value that doesn't refer to exactly one row of ``table`` at once, with
+    ``errors`` mapping each of those values to why not.
+    """
+
+    def __init__(self, table, errors):
+        self.table = table
+        self.errors = errors
+        super(UnresolvedFields, self).__init__('Could not resolve {count} of the given {table}:\n{errors}'.format(
+            count=len(errors), table=table.__tablename__, errors='\n'.join('  ' + error for error in errors.values())))
+
+
+class Match(object):
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id_, name):
+        self.id = id_
+        self.name = name
+
+
+class TaskMatch(Match):
+    __slots__ = ('client_name',)
+
+    def __init__(self, id_, name, client_name):
+        super(TaskMatch, self).__init__(id_, name)
+        self.client_name = client_name
+
+
+def find_fields(session, table, field):
+    index = session_index(session)
+    if index is not None:
+        names = index[table]
+        return [Match(id_, names.names[id_]) for id_ in names.search(field)]
+    ids = search_names(session.connection(), table, field)
+    if ids is not None:
+        return session.query(table).filter(table.id.in_(ids)).order_by(table.id).all() if ids else []
+    return session.query(table).filter(table.name.ilike('%{}%'.format(escape_like(field)), escape='\\')).all()
+
+
+def find_tasks(session, task_name, client_name=None):
+    index = session_index(session)
+    if index is not None:
+        names = index[Task]
+        ids = names.search(task_name) if task_name else sorted(names.names)
+        tasks = [TaskMatch(id_, names.names[id_], index.client_name(id_)) for id_ in ids]
+    else:
+        ids = search_names(session.connection(), Task, task_name) if task_name else None
+        if ids is not None:
+            query = session.query(Task).filter(Task.id.in_(ids)).order_by(Task.id)
+        elif task_name:
+            query = session.query(Task).filter(Task.name.ilike('%{}%'.format(escape_like(task_name)), escape='\\'))
+        else:
+            query = session.query(Task)
+        tasks = [TaskMatch(task.id, task.name, task.get_client().name) for task in query.all()]
+    if client_name is not None:
+        tasks = [task for task in tasks if client_name.lower() in (task.client_name or '').lower()]
+    return tasks
+
+
+def describe_field(session, table, field_id):
+    index = session_index(session)
+    if index is not None:
+        return index[table].describe(field_id)
+    return session.query(table).get(field_id)
+
+
+def as_id(field):
+    """
+    ``field`` as an id if it is one (an int, or a string of digits), otherwise ``None``.
+    """
+    if isinstance(field, str) and field.strip().isdigit():
+        return int(field)
+    return field if isinstance(field, int) else None
+
+
+@traced('resolve')
+def resolve_field(session, table, field):
+    """
+    Non-interactive version of ``get_field``: return the id ``field`` refers to, preferring an exact (case
+    insensitive) name match, or raise a ``ValueError`` if it is unknown or ambiguous.
+    """
+    return _resolve_field(session, table, field)
+
+
+def _resolve_field(session, table, field):
+    id_ = as_id(field)
+    if id_ is not None:
+        if describe_field(session, table, id_) is None:
+            raise ValueError('No {table} with id {id_}'.format(table=table.__tablename__, id_=id_))
+        return id_
+    if table is Task:
+        field_split = field.split(':')
+        matches = find_tasks(session, field_split[-1], field_split[0] if len(field_split) == 2 else None)
+        name = field_split[-1]
+    else:
+        matches = find_fields(session, table, field)
+        name = field
+    if len(matches) > 1:
+        matches = [match for match in matches if match.name.lower() == name.lower()] or matches
+    if len(matches) == 0:
+        raise ValueError('Could not find any {table} matching "{field}"'.format(table=table.__tablename__, field=field))
+    elif len(matches) > 1:
+        raise ValueError('"{field}" is ambiguous, it matches {table} {ids}'.format(
+            field=field, table=table.__tablename__, ids=', '.join(str(match.id) for match in matches)))
+    return matches[0].id
+
+
+def known_ids(session, table, ids):
+    """
+    Which of ``ids`` are in the cached ``table``: checked against the resolution index, or else with one
+    ``IN (...)`` query per ``IN_QUERY_BATCH_SIZE`` ids.
+    """
+    index = session_index(session)
+    if index is not None:
+        names = index[table].names
+        return {id_ for id_ in ids if id_ in names}
+    ids = sorted(ids)
+    known = set()
+    for i in range(0, len(ids), IN_QUERY_BATCH_SIZE):
+        known.update(id_ for id_, in session.query(table.id).filter(table.id.in_(ids[i:i + IN_QUERY_BATCH_SIZE])))
+    return known
+
+
+def resolution_memo(session):
+    """
+    The ``(table name, value) -> (id, error)`` results of ``lookup_fields`` on ``session``, kept until the cache's
+    resolution index changes (i.e. until the next load or sync, in this process or another).
+    """
+    index = session_index(session)
+    memo = session.info.get('resolved_fields')
+    if memo is None or memo[0] is not index:
+        memo = session.info['resolved_fields'] = (index, {})
+    return memo[1]
+
+
+@traced('resolve')
+def lookup_fields(session, table, values):
+    """
+    Resolve every one of ``values`` (ids or names, as for ``resolve_field``) at once, without prompting. All the ids
+    are checked together (see ``known_ids``) and each name is looked up once, however often it appears.
+    Returns a mapping of each distinct value to ``(id, None)``, or ``(None, error)`` if it is unknown or ambiguous.
+    """
+    memo = resolution_memo(session)
+    table_name = table.__tablename__
+    pending = [value for value in OrderedDict.fromkeys(values) if (table_name, value) not in memo]
+    ids = {value: as_id(value) for value in pending if as_id(value) is not None}
+    if ids:
+        known = known_ids(session, table, set(ids.values()))
+        for value, id_ in ids.items():
+            memo[table_name, value] = (id_, None) if id_ in known else \
+                (None, 'No {table} with id {id_}'.format(table=table_name, id_=id_))
+    for value in pending:
+        if value not in ids:
+            try:
+                memo[table_name, value] = (_resolve_field(session, table, value), None)
+            except ValueError as e:
+                memo[table_name, value] = (None, str(e))
+    return OrderedDict((value, memo[table_name, value]) for value in OrderedDict.fromkeys(values))
+
+
+def resolve_fields(session, table, values):
+    """
+    The ids ``values`` refer to (see ``lookup_fields``), in order. Raises ``UnresolvedFields`` listing every value
+    that couldn't be resolved.
+    """
+    results = lookup_fields(session, table, values)
+    errors = OrderedDict((value, error) for value, (_, error) in results.items() if error is not None)
+    if errors:
+        raise UnresolvedFields(table, errors)
+    return [results[value][0] for value in values]
+
+
+@traced('resolve')
 def get_field(session, table, field):
     if table is Task:
         return get_task_field(session, field)
     print("validating {table} from {task_id}:".format(table=table.__tablename__, task_id=field))
     if not isinstance(field, int):
-        fields = session.query(table).filter(table.name.ilike('%{field}%'.format(field=field))).all()
+        fields = find_fields(session, table, field)
         if len(fields) == 0:
             print('  Could not find any {table} matching "{field}"'.format(table=table.__tablename__, field=field))
             sys.exit(1)
@@ -21,7 +201,7 @@ def get_field(session, table, field):
                               .format(table=table.__class__.__name__.lower())))
         else:
             field = fields[0].id
-    print('    Got {}'.format(session.query(table).get(field)))
+    print('    Got {}'.format(describe_field(session, table, field)))
     return field
 
 
@@ -29,20 +209,14 @@ def get_task_field(session, task_id):
     print("validating Task from {task_id}:".format(task_id=task_id))
     if not isinstance(task_id, int):
         task_id_split = task_id.split(':')
-        if task_id_split[-1]:
-            tasks = session.query(Task) \
-                .filter(Task.name.ilike('%{task_id_split}%'.format(task_id_split=task_id_split[-1]))).all()
-        else:
-            tasks = session.query(Task).all()
-        if len(task_id_split) == 2:
-            tasks = [task for task in tasks if task_id_split[0].lower() in task.get_client().name.lower()]
+        tasks = find_tasks(session, task_id_split[-1], task_id_split[0] if len(task_id_split) == 2 else None)
         if len(tasks) == 0:
             print('  Could not find any task matching "{task_id}"'.format(task_id=task_id))
             sys.exit(1)
         elif len(tasks) > 1:
             t = [(
                 '{task_id}'.format(task_id=task.id),
-                '{client}'.format(client=task.get_client().name),
+                '{client}'.format(client=task.client_name),
                 '{task_name}'.format(task_name=task.name)
             ) for task in tasks]
             l = [max(len(x[y]) for x in t) for y in range(len(t[0]))]
@@ -51,5 +225,5 @@ def get_task_field(session, task_id):
             task_id = int(input('  Please enter the id of desired task from above: '))
         else:
             task_id = tasks[0].id
-        print('    Got {}'.format(session.query(Task).get(task_id)))
+        print('    Got {}'.format(describe_field(session, Task, task_id)))
     return task_id
@@ -0,0 +1,90 @@
+import codecs
+import json
+import re
+
+_TOKEN = re.compile(r'[{}\[\]"]')
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_SEPARATOR = re.compile(r'[\s,]*')
+_OPENERS = {'{', '['}
+_CLOSERS = {'}', ']'}
+
+
+def decode_chunks(chunks, encoding='utf-8'):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_array_items(chunks, key):
+    """
+    Yield the items of the array stored under ``key`` in a JSON object, parsing them one at a time as ``chunks``
+    (``bytes`` or ``str``) arrive, so that only a single item is ever held in memory.
+
+    The items must be objects or arrays. Only the array under the first occurrence of ``key`` is read; the rest
+    of the document is ignored.
+    """
+    chunks = decode_chunks(chunks)
+    start = re.compile(r'"{key}"\s*:\s*\['.format(key=re.escape(key)))
+    buffer = ''
+
+    for chunk in chunks:
+        buffer += chunk
+        match = start.search(buffer)
+        if match is not None:
+            break
+    else:
+        raise ValueError('Could not find an array for "{key}" in the JSON document'.format(key=key))
+
+    pos = match.end()
+    depth = 0
+    item_start = None
+    while True:
+        if item_start is None:
+            pos = _SEPARATOR.match(buffer, pos).end()
+            if pos < len(buffer):
+                if buffer[pos] == ']':
+                    return
+                if buffer[pos] not in _OPENERS:
+                    raise ValueError('Only arrays of objects or arrays can be streamed, got "{char}" in "{key}"'
+                                     .format(char=buffer[pos], key=key))
+                item_start = pos
+                continue
+        else:
+            token = _TOKEN.search(buffer, pos)
+            while token is not None:
+                char = token.group()
+                if char == '"':
+                    string = _STRING.match(buffer, token.start())
+                    if string is None:
+                        # The string runs past the end of what we have so far
+                        pos = token.start()
+                        break
+                    pos = string.end()
+                else:
+                    pos = token.end()
+                    depth += 1 if char in _OPENERS else -1
+                    if depth == 0:
+                        yield json.loads(buffer[item_start:pos])
+                        item_start = None
+                        break
+                token = _TOKEN.search(buffer, pos)
+            else:
+                pos = len(buffer)
+            if item_start is None:
+                continue
+
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            raise ValueError('Unexpected end of JSON document while reading "{key}"'.format(key=key))
+        # What has been parsed is dropped once per chunk, rather than copying the rest of the buffer after every item
+        parsed = pos if item_start is None else item_start
+        buffer = buffer[parsed:] + chunk
+        pos -= parsed
+        if item_start is not None:
+            item_start = 0
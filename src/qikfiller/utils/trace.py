@@ -0,0 +1,264 @@
+"""
+Opt in instrumentation of a qikfiller run (``qikfiller --profile ...`` or ``QIKFILLER_TRACE``): wall time spent in
+each phase (api requests, schema loading, cache writes and commits, field resolution), api request counts and
+response sizes, and SQL statement counts, written out as JSON when the run ends. Optionally the run is also profiled
+with cProfile.
+
+Everything is a no-op unless a trace has been started, so the instrumented code paths cost next to nothing otherwise.
+"""
+import atexit
+import json
+import sys
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+from functools import wraps
+from os import getenv
+from time import perf_counter
+
+from qikfiller.constants import TRACE_TOP_FUNCTIONS
+
+FALSE_VALUES = ('', '0', 'false', 'no', 'off')
+
+
+class _NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase(object):
+    __slots__ = ('trace', 'name', 'started')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.add_time(self.name, perf_counter() - self.started)
+        return False
+
+
+class Trace(object):
+    """
+    Counters for one run. Phases may nest (e.g. ``http`` requests made while loading), and phases run on worker
+    threads add up the time of every thread, so phase times can add up to more than the wall time of the run.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.output = None
+        self.cprofile_path = None
+        self._profiler = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.command = None
+        self.started_at = None
+        self._started = None
+        self.phases = OrderedDict()
+        self.requests = Counter()
+        self.request_statuses = Counter()
+        self.sql = Counter()
+        self.sql_verbs = Counter()
+
+    def start(self, output='-', cprofile=None, command=None):
+        """
+        Start tracing, writing the results as JSON to ``output`` (a path, or '-' for stderr) when the process exits
+        or ``finish`` is called. With ``cprofile`` (a path), the main thread is profiled too and its stats dumped there.
+        """
+        if self.enabled:
+            return
+        self._reset()
+        self.enabled = True
+        self.output = output
+        self.cprofile_path = cprofile
+        self.command = list(sys.argv[1:] if command is None else command)
+        self.started_at = datetime.now()
+        self._started = perf_counter()
+        _listen_sql()
+        atexit.register(self.finish)
+        if cprofile:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def phase(self, name):
+        """
+        Context manager timing the ``with`` block as (another call of) phase ``name``.
+        """
+        return _Phase(self, name) if self.enabled else _NULL_PHASE
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            phase = self.phases.setdefault(name, Counter())
+            phase['calls'] += 1
+            phase['seconds'] += seconds
+
+    def request(self, method, status, size, seconds):
+        """
+        Record one api request (a retry counts as another request). ``status`` is ``None`` for a connection error or
+        timeout, and ``size`` the length of the response body as sent.
+        """
+        if not self.enabled:
+            return
+        self.add_time('http', seconds)
+        with self._lock:
+            self.requests[method] += 1
+            self.requests['bytes'] += size
+            self.request_statuses['error' if status is None else str(status)] += 1
+
+    def statement(self, statement, seconds=None):
+        if not self.enabled:
+            return
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+        with self._lock:
+            self.sql['statements'] += 1
+            self.sql_verbs[verb] += 1
+            if seconds is not None:
+                self.sql['seconds'] += seconds
+
+    def results(self):
+        from platform import python_version
+
+        results = OrderedDict()
+        results['command'] = self.command
+        results['started_at'] = self.started_at.isoformat()
+        results['python'] = python_version()
+        results['wall_seconds'] = round(perf_counter() - self._started, 6)
+        results['phases'] = OrderedDict(
+            (name, OrderedDict((('calls', phase['calls']), ('seconds', round(phase['seconds'], 6)))))
+            for name, phase in self.phases.items()
+        )
+        results['http'] = OrderedDict((
+            ('requests', sum(count for key, count in self.requests.items() if key != 'bytes')),
+            ('bytes', self.requests['bytes']),
+            ('by_method', OrderedDict(sorted((key, count) for key, count in self.requests.items() if key != 'bytes'))),
+            ('by_status', OrderedDict(sorted(self.request_statuses.items()))),
+        ))
+        results['sql'] = OrderedDict((
+            ('statements', self.sql['statements']),
+            ('seconds', round(self.sql['seconds'], 6)),
+            ('by_verb', OrderedDict(sorted(self.sql_verbs.items()))),
+        ))
+        if self._profiler is not None:
+            results['cprofile'] = OrderedDict((('path', self.cprofile_path), ('top', self._top_functions())))
+        return results
+
+    def _top_functions(self):
+        import pstats
+
+        stats = pstats.Stats(self._profiler).stats
+        top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TRACE_TOP_FUNCTIONS]
+        return [
+            OrderedDict((
+                ('function', '{}:{}({})'.format(*function)),
+                ('calls', calls),
+                ('own_seconds', round(own, 6)),
+                ('cumulative_seconds', round(cumulative, 6)),
+            ))
+            for function, (_, calls, own, cumulative, _) in top
+        ]
+
+    def finish(self):
+        """
+        Stop tracing and write out the results (if a trace was started).
+        """
+        if not self.enabled:
+            return
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.cprofile_path)
+        text = json.dumps(self.results(), indent=2)
+        self.enabled = False
+        self._profiler = None
+        if self.output in (None, '-'):
+            print(text, file=sys.stderr)
+        else:
+            with open(self.output, 'w') as f:
+                f.write(text + '\n')
+
+
+trace = Trace()
+
+
+def traced(name):
+    """
+    Decorator timing every call of the function as phase ``name`` while a trace is running.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not trace.enabled:
+                return func(*args, **kwargs)
+            with trace.phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def trace_options(profile=None, cprofile=None):
+    """
+    Where to write the trace and cProfile stats, from the ``--profile``/``--cprofile`` options or else the
+    ``QIKFILLER_TRACE``/``QIKFILLER_CPROFILE`` environment variables. ``True`` (or 1) means stderr for the trace.
+    Returns ``(None, None)`` if tracing isn't asked for.
+    """
+    profile = profile if profile is not None else getenv('QIKFILLER_TRACE')
+    cprofile = cprofile if cprofile is not None else getenv('QIKFILLER_CPROFILE')
+    if isinstance(profile, str) and profile.lower() in FALSE_VALUES:
+        profile = None
+    if cprofile and not profile:
+        profile = True
+    if not profile:
+        return None, None
+    if profile is True or str(profile).lower() in ('1', 'true', 'yes', 'on'):
+        profile = '-'
+    return str(profile), cprofile or None
+
+
+_sql_listening = False
+
+
+def _listen_sql():
+    # Hooked into every engine, once, the first time a trace is started
+    global _sql_listening
+    if _sql_listening:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.orm import Session
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info['trace_started'] = perf_counter()
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('trace_started', None)
+        trace.statement(statement, perf_counter() - started if started is not None else None)
+
+    @event.listens_for(Session, 'before_commit')
+    def before_commit(session):
+        session.info['trace_commit'] = perf_counter()
+
+    @event.listens_for(Session, 'after_commit')
+    def after_commit(session):
+        started = session.info.pop('trace_commit', None)
+        if trace.enabled and started is not None:
+            trace.add_time('orm.commit', perf_counter() - started)
+
+    _sql_listening = True
@@ -3,29 +3,45 @@ from os import getenv
 
 from qikfiller.cache.orm import Profile
 from qikfiller.constants import ALL, VALID_DATE_TYPES
-from qikfiller.utils.fields import get_field
+from qikfiller.utils.fields import resolve_fields
 
 
-def validate_qik_api_key(session, qik_api_key):
+def find_qik_api_key(session, qik_api_key=None):
+    """
+    The api key given, else ``QIK_API_KEY``, else the one stored in the cache by ``init``, or ``None``.
+    """
     qik_api_key = qik_api_key if qik_api_key is not None else getenv('QIK_API_KEY')
     if qik_api_key is None:
         try:
             return session.query(Profile).first().qik_api_key
         except AttributeError:
             pass
-    if qik_api_key is None:
-        print("Please provide your QIK API key")
-        sys.exit(1)
     return qik_api_key
 
 
-def validate_qik_api_url(session, qik_api_url):
+def find_qik_api_url(session, qik_api_url=None):
+    """
+    The api url given, else ``QIK_API_URL``, else the one stored in the cache by ``init``, or ``None``.
+    """
     qik_api_url = qik_api_url if qik_api_url is not None else getenv('QIK_API_URL')
     if qik_api_url is None:
         try:
             return session.query(Profile).first().qik_api_url
         except AttributeError:
             pass
+    return qik_api_url
+
+
+def validate_qik_api_key(session, qik_api_key):
+    qik_api_key = find_qik_api_key(session, qik_api_key)
+    if qik_api_key is None:
+        print("Please provide your QIK API key")
+        sys.exit(1)
+    return qik_api_key
+
+
+def validate_qik_api_url(session, qik_api_url):
+    qik_api_url = find_qik_api_url(session, qik_api_url)
     if qik_api_url is None:
         print("Please provide your the url to you QikTimes instance")
         sys.exit(1)
@@ -43,22 +59,20 @@ def validate_limit(limit):
     limit = int(limit)
     if limit < 1:
         raise ValueError('limit option must be an integer >0')
+    return limit
 
 
 def validate_field(session, table, field):
-    if isinstance(field, int):
-        try:
-            return session.query(table).get(field).id
-        except AttributeError:
-            raise ValueError(
-                'No {table} with id {field_id}'.format(table=table.__class__.__name__.lower(), field_id=field))
-    else:
-        return get_field(session, table, field)
+    return resolve_fields(session, table, [field])[0]
 
 
 def validate_field_collection(session, table, field):
+    """
+    The id (or comma separated ids, for a collection) ``field`` refers to, or ``ALL``. Every value is resolved in one
+    go (see ``resolve_fields``), raising ``UnresolvedFields`` with all of those that are unknown or ambiguous.
+    """
     if isinstance(field, (list, tuple, set)):
-        return ','.join(str(validate_field(session, table, f)) for f in field)
+        return ','.join(str(id_) for id_ in resolve_fields(session, table, list(field)))
     if isinstance(field, str) and (field.lower() == ALL.lower()):
         return ALL
     return validate_field(session, table, field)
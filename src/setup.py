@@ -23,6 +23,11 @@ setup(
         'six',
         'SQLAlchemy',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'export': ['numpy'],
+        'parquet': ['numpy', 'pyarrow'],
+    },
     classifiers=[
         'Intended Audience :: Developers',
         'License :: MIT',
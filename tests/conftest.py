@@ -0,0 +1,9 @@
+import sys
+from os.path import abspath, dirname, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+# The package lives under src/, as the benchmarks expect it on PYTHONPATH, and the tests share the benchmarks'
+# payload fixtures
+sys.path.insert(0, join(ROOT, 'src'))
+sys.path.insert(0, join(ROOT, 'benchmarks'))
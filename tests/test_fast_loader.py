@@ -0,0 +1,113 @@
+"""
+``FastLoader`` has to load exactly what the marshmallow list schemas load, and reject exactly what they reject, with
+the same error messages.
+"""
+import pytest
+from marshmallow import ValidationError
+
+from fixtures import group_rows, tasks_payload
+from qikfiller.cache.orm import Category, Client, TagType, Type, User
+from qikfiller.cache.sync import group_loaded
+from qikfiller.schemas.lists.categories import CategoriesSchema
+from qikfiller.schemas.lists.client import ClientsSchema
+from qikfiller.schemas.lists.fast import FastLoader
+from qikfiller.schemas.lists.tag_types import TagTypesSchema
+from qikfiller.schemas.lists.types import TypesSchema
+from qikfiller.schemas.lists.user import UsersSchema
+
+TABLES = {CategoriesSchema: Category, ClientsSchema: Client, TagTypesSchema: TagType, TypesSchema: Type,
+          UsersSchema: User}
+
+USER = {
+    'id': 1, 'name': 'Bob', 'login': 'bob', 'time_zone': 'Brisbane', 'email': 'bob@example.com',
+    'first_name': 'Bob', 'last_name': 'Smith', 'enabled': True, 'is_admin': 'false',
+    'updated_at': '2017-03-01T10:00:00+10:00', 'last_login': '2017-03-01T10:00:00', 'created_at': '2016-01-01T00:00:00',
+}
+TYPE = {'id': '1', 'name': 'Billable', 'colour': '#fff', 'enabled': 1, 'user_creatable': 't'}
+
+
+def client(**fields):
+    return dict({'id': 1, 'name': 'Client'}, **fields)
+
+
+def task(**fields):
+    return dict({'id': 2, 'name': 'Task'}, **fields)
+
+
+VALID = [
+    (ClientsSchema, tasks_payload(500, depth=3)),
+    (ClientsSchema, {'clients': [client(id='7', owner_id=None, owner_name=None, custom_fields=[], tasks=[
+        task(archived='true', estimated_hours='40', custom_fields=['a', 'b'], sub_tasks=[
+            task(id=3, archived=0, owner_id='5', estimated_hours=None),
+            task(id=4, archived='False', sub_tasks=[]),
+        ]),
+    ])]}),
+    (ClientsSchema, {'clients': [client(unknown='ignored')]}),
+    (ClientsSchema, {'clients': []}),
+    (UsersSchema, {'users': [USER, dict(USER, id=2, enabled='T', is_admin=0)]}),
+    (TypesSchema, {'types': [TYPE, dict(TYPE, id=2, enabled='FALSE', user_creatable=False)]}),
+    (TagTypesSchema, {'tag_types': [{'id': 1, 'name': 'Tag', 'description': None}]}),
+    (CategoriesSchema, {'categories': [{'id': 1, 'name': 'Development'}]}),
+]
+
+INVALID = [
+    # Required and missing fields
+    (ClientsSchema, {'clients': [{'name': 'No id'}]}),
+    (ClientsSchema, {'clients': [client(tasks=[{'name': 'No id'}])]}),
+    (TypesSchema, {'types': [{'id': 1, 'name': 'Billable'}]}),
+    (TagTypesSchema, {'tag_types': [{'id': 1, 'name': 'Tag'}]}),
+    (ClientsSchema, {'clients': [client(name=None)]}),
+    # Bad types
+    (ClientsSchema, {'clients': [client(id='1.5')]}),
+    (ClientsSchema, {'clients': [client(id='one')]}),
+    (ClientsSchema, {'clients': [client(id=[1])]}),
+    (ClientsSchema, {'clients': [client(name=7)]}),
+    (ClientsSchema, {'clients': [client(tasks=[task(estimated_hours='1.5')])]}),
+    (ClientsSchema, {'clients': 5}),
+    (ClientsSchema, {'clients': [5, client(id='x'), 6]}),
+    (UsersSchema, {'users': [dict(USER, email='not an email')]}),
+    (UsersSchema, {'users': [dict(USER, updated_at='yesterday')]}),
+    # Booleans
+    (TypesSchema, {'types': [dict(TYPE, enabled=True, user_creatable='maybe')]}),
+    (TypesSchema, {'types': [dict(TYPE, enabled=2)]}),
+    (TypesSchema, {'types': [dict(TYPE, enabled='yes')]}),
+    (TypesSchema, {'types': [dict(TYPE, enabled=[])]}),
+    (ClientsSchema, {'clients': [client(tasks=[task(archived='x')])]}),
+    # Nested lists
+    (ClientsSchema, {'clients': [client(custom_fields='a|b')]}),
+    (ClientsSchema, {'clients': [client(custom_fields=['a', 2, 3])]}),
+    (ClientsSchema, {'clients': [client(tasks=5)]}),
+    (ClientsSchema, {'clients': [client(tasks=[5, 6])]}),
+    (ClientsSchema, {'clients': [client(tasks=[task(sub_tasks=[task(id=3, name=7)])])]}),
+    (ClientsSchema, {'clients': [client(tasks=[task(), task(id='x', archived='x')]), client(id=None)]}),
+]
+
+
+def marshmallow_load(schema, payload):
+    collection = schema(strict=True).load(payload).data
+    # Collection objects keep their items under their own name, see BaseCollectionObject
+    return group_rows(getattr(collection, type(collection).__name__.lower()))
+
+
+def fast_load(schema, payload, sample=None):
+    return group_loaded(TABLES[schema], FastLoader(schema, sample=sample).load(payload))
+
+
+@pytest.mark.parametrize('schema, payload', VALID)
+def test_loads_the_same_rows(schema, payload):
+    assert fast_load(schema, payload) == marshmallow_load(schema, payload)
+
+
+def test_sampling_loads_the_same_rows_from_a_well_formed_payload():
+    # Only the sample is validated: the items after it are trusted to be in the form the api sends
+    payload = tasks_payload(500, depth=3)
+    assert fast_load(ClientsSchema, payload, sample=5) == marshmallow_load(ClientsSchema, payload)
+
+
+@pytest.mark.parametrize('schema, payload', INVALID)
+def test_rejects_with_the_same_errors(schema, payload):
+    with pytest.raises(ValidationError) as expected:
+        marshmallow_load(schema, payload)
+    with pytest.raises(ValidationError) as error:
+        fast_load(schema, payload)
+    assert error.value.messages == expected.value.messages
@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import create_engine
+
+from qikfiller.api.http_cache import HttpCache
+from qikfiller.cache.migrations import create_schema, drop_schema
+from qikfiller.cache.orm import HttpValidator, Session, Type
+
+URL = 'http://qik.example.com/api/v1/types.json'
+KEY = HttpCache.key(URL, 'profile')
+VALIDATORS = {'ETag': '"abc"', 'Last-Modified': 'Wed, 01 Mar 2017 00:00:00 GMT'}
+CONDITIONAL_HEADERS = {'If-None-Match': '"abc"', 'If-Modified-Since': 'Wed, 01 Mar 2017 00:00:00 GMT'}
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    with engine.connect() as connection:
+        create_schema(connection)
+        session = Session(bind=connection)
+        session.add(Type(id=1, name='Billable'))
+        session.commit()
+        yield session
+        session.close()
+
+
+def test_validators_are_sent_back(session):
+    cache = HttpCache(session)
+    cache.put(KEY, URL, VALIDATORS)
+    session.commit()
+    assert cache.conditional_headers(KEY, Type) == CONDITIONAL_HEADERS
+
+
+def test_validators_are_only_stored_with_the_lists(session):
+    cache = HttpCache(session)
+    cache.put(KEY, URL, VALIDATORS)
+    session.rollback()
+    assert cache.conditional_headers(KEY, Type) == {}
+
+
+def test_no_validators_are_sent_for_an_empty_table(session):
+    cache = HttpCache(session)
+    cache.put(KEY, URL, VALIDATORS)
+    session.query(Type).delete()
+    session.commit()
+    assert cache.conditional_headers(KEY, Type) == {}
+
+
+def test_expired_validators_are_dropped(session):
+    cache = HttpCache(session, ttl=-1)
+    cache.put(KEY, URL, VALIDATORS)
+    session.commit()
+    assert cache.conditional_headers(KEY, Type) == {}
+    cache.put(KEY, URL, VALIDATORS)
+    session.commit()
+    assert session.query(HttpValidator).count() == 1
+
+
+def test_dropping_the_schema_drops_the_validators(session):
+    HttpCache(session).put(KEY, URL, VALIDATORS)
+    session.commit()
+    drop_schema(session.connection())
+    create_schema(session.connection())
+    session.add(Type(id=1, name='Billable'))
+    session.commit()
+    assert HttpCache(session).conditional_headers(KEY, Type) == {}
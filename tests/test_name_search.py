@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from qikfiller.cache.fts import SEARCH_SQL, create_name_search, refresh_name_search, search_names
+from qikfiller.cache.migrations import create_schema
+from qikfiller.cache.orm import Type
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine('sqlite://')
+    with engine.connect() as connection:
+        create_schema(connection)
+        if not create_name_search(connection):
+            pytest.skip('this sqlite has no fts5 trigram tokenizer')
+        connection.execute(text("INSERT INTO types (id, name) VALUES (1, 'Billable'), (2, 'Unbillable'), "
+                                "(3, 'Bill_able'), (4, '100% Billable')"))
+        refresh_name_search(connection)
+        yield connection
+
+
+def test_search_uses_the_trigram_index(connection):
+    plan = ' '.join(row[-1] for row in connection.execute(
+        text('EXPLAIN QUERY PLAN ' + SEARCH_SQL), {'pattern': '%bill%', 'table': 'types'}))
+    # fts5 reports the LIKE constraints it answers from the index as L<column> after the index number
+    assert 'VIRTUAL TABLE INDEX 0:L' in plan
+
+
+def test_search_is_a_case_insensitive_substring_match(connection):
+    assert search_names(connection, Type, 'BILL') == [1, 2, 3, 4]
+    assert search_names(connection, Type, 'unbill') == [2]
+
+
+@pytest.mark.parametrize('name', ['Bill_', '100%', 'a\\b', 'bi'])
+def test_names_the_index_cannot_answer_are_left_to_the_caller(connection, name):
+    assert search_names(connection, Type, name) is None